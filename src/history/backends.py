@@ -0,0 +1,224 @@
+"""
+Storage backends for historical records.
+
+By default, historical records are stored in the table of the generated
+history model (ModelBackend). Another backend can be passed to
+HistoricalRecords(backend=...):
+
+    class MyModel(models.Model):
+        ...
+        history = HistoricalRecords(
+            backend=SQLiteLogBackend('/var/lib/myapp/history.db'))
+
+A backend implements:
+- write(history_model, records): store unsaved historical records, in order.
+- latest(manager, pk, date=None): the most recent record of pk (as of date,
+  if given), or None.
+- versions(manager, pk=None): iterate over the records of pk (or of every
+  object), newest first.
+- previous(manager, pk, history_id): the record of pk preceding history_id,
+  or None.
+
+most_recent(), as_of(), versions(), created_date, last_modified_date,
+created_by, last_modified_by, previous_entry, modified_fields and the change
+detection on save go through the backend. Querysets (all(), filter(), ...)
+always read the history model's table; the HistoryManager methods, change
+feeds and management commands built on them refuse to work on models whose
+records are stored elsewhere (see uses_table()).
+"""
+import datetime
+import json
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.encoding import force_text
+
+
+class ModelBackend(object):
+    """
+    Store records in the history model's table.
+    """
+
+    def write(self, history_model, records):
+        if len(records) == 1:
+            records[0].save()
+        else:
+            history_model._default_manager.bulk_create(records)
+
+    def _records(self, manager, pk):
+        return manager._filter_queryset_by_pk(manager.get_query_set(), pk)
+
+    def latest(self, manager, pk, date=None):
+        qs = self._records(manager, pk)
+        if date is not None:
+            qs = qs.filter(history_date__lte=date)
+        try:
+            return qs[0]
+        except IndexError:
+            return None
+
+    def versions(self, manager, pk=None):
+        if pk is None:
+            return manager.get_query_set().iterator()
+        return self._records(manager, pk).iterator()
+
+    def previous(self, manager, pk, history_id):
+        try:
+            return self._records(manager, pk).order_by('-history_id')\
+                .filter(history_id__lt=history_id)[0]
+        except IndexError:
+            return None
+
+
+def uses_table(history_model):
+    """
+    Return True if the records of history_model are stored in its table.
+    """
+    return isinstance(history_model.historical_records.backend, ModelBackend)
+
+
+def require_table(history_model, user):
+    """
+    Raise ImproperlyConfigured if the records of history_model aren't stored
+    in its table, which user (e.g. 'page()') reads.
+    """
+    if not uses_table(history_model):
+        raise ImproperlyConfigured(
+            "%s reads the history table, but the history of %s is stored by "
+            "%s." % (user, history_model.primary_model._meta.object_name,
+                     history_model.historical_records.backend.__class__.__name__))
+
+
+def encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return force_text(value)
+
+
+class SQLiteLogBackend(object):
+    """
+    Append records to a local SQLite file, one row per record holding its
+    metadata and its field values as JSON. Appending to a local file is much
+    cheaper than an insert over the network, at the price of querysets: the
+    history model's table stays empty.
+
+    Records are written as soon as they are created, outside of the
+    database transaction, and are not removed if it is rolled back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        # sqlite3 connections can't be shared between threads.
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            # Readers don't block the appending writer and vice versa.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS history_log ('
+                'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'label TEXT NOT NULL, pk TEXT NOT NULL, date TEXT NOT NULL, '
+                'type TEXT NOT NULL, editor_id INTEGER, data TEXT NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS history_log_pk '
+                'ON history_log (label, pk, seq)')
+            self.local.connection = connection
+        return connection
+
+    def label(self, history_model):
+        return '%s.%s' % (history_model._meta.app_label,
+                          history_model._meta.object_name)
+
+    def encode_date(self, date):
+        # A fixed width, UTC format, so that dates compare as strings.
+        if settings.USE_TZ and timezone.is_aware(date):
+            date = timezone.make_naive(date, timezone.utc)
+        return date.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def decode_date(self, value):
+        date = datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+        if settings.USE_TZ:
+            date = timezone.make_aware(date, timezone.utc)
+        return date
+
+    def write(self, history_model, records):
+        pk_name = history_model.primary_model._meta.pk.attname
+        label = self.label(history_model)
+        rows = []
+        for record in records:
+            if record.history_date is None:
+                record.history_date = timezone.now()
+            data = dict((name, getattr(record, name))
+                        for name in history_model.important_field_names)
+            rows.append((label, force_text(getattr(record, pk_name)),
+                         self.encode_date(record.history_date),
+                         record.history_type, record.history_editor_id,
+                         json.dumps(data, default=encode_value)))
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                'INSERT INTO history_log '
+                '(label, pk, date, type, editor_id, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def decode(self, history_model, row):
+        seq, date, history_type, editor_id, data = row
+        columns = dict((f.attname, f) for f in history_model._meta.fields)
+        fields = dict(getattr(history_model, 'snapshot_fields', {}), **columns)
+        values = dict((str(name), fields[name].to_python(value))
+                      for name, value in json.loads(data).items()
+                      if name in fields)
+        record = history_model(
+            history_id=seq, history_date=self.decode_date(date),
+            history_type=history_type, history_editor_id=editor_id,
+            **dict((name, value) for name, value in values.items()
+                   if name in columns))
+        # fields kept in the snapshot of a snapshot history model
+        for name, value in values.items():
+            if name not in columns:
+                setattr(record, name, value)
+        return record
+
+    def latest(self, manager, pk, date=None):
+        sql = ('SELECT seq, date, type, editor_id, data FROM history_log '
+               'WHERE label = ? AND pk = ?')
+        params = [self.label(manager.model), force_text(pk)]
+        if date is not None:
+            sql += ' AND date <= ?'
+            params.append(self.encode_date(date))
+        row = self.connection().execute(
+            sql + ' ORDER BY seq DESC LIMIT 1', params).fetchone()
+        return row and self.decode(manager.model, row)
+
+    def versions(self, manager, pk=None):
+        sql = ('SELECT seq, date, type, editor_id, data FROM history_log '
+               'WHERE label = ?')
+        params = [self.label(manager.model)]
+        if pk is not None:
+            sql += ' AND pk = ?'
+            params.append(force_text(pk))
+        cursor = self.connection().execute(sql + ' ORDER BY seq DESC', params)
+        for row in cursor:
+            yield self.decode(manager.model, row)
+
+    def previous(self, manager, pk, history_id):
+        row = self.connection().execute(
+            'SELECT seq, date, type, editor_id, data FROM history_log '
+            'WHERE label = ? AND pk = ? AND seq < ? ORDER BY seq DESC LIMIT 1',
+            [self.label(manager.model), force_text(pk), history_id]).fetchone()
+        return row and self.decode(manager.model, row)
+
+    def clear(self, history_model):
+        """
+        Delete every record of history_model from the log.
+        """
+        connection = self.connection()
+        with connection:
+            connection.execute('DELETE FROM history_log WHERE label = ?',
+                               [self.label(history_model)])
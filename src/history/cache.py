@@ -0,0 +1,132 @@
+"""
+Caches for historical record lookups.
+
+Only as_of() lookups for dates older than CACHE_MIN_AGE are cached: new
+versions are dated when they are written, so once every transaction that
+was open at that date has ended, the record such a lookup resolves to no
+longer changes, whatever other processes write or roll back. most_recent()
+and the change check on save always read the backend.
+
+A cache is shared by all lookups on one history model and keyed by primary
+key; writing a historical record still invalidates every key of its primary
+key, e.g. for versions restored by restore_to().
+
+Any object implementing get(pk, key), set(pk, key, record) and
+invalidate(pk) can be passed to HistoricalRecords(cache=...).
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import get_cache
+
+
+# Longer than any transaction writing history is expected to stay open.
+CACHE_MIN_AGE = datetime.timedelta(minutes=10)
+
+# Django 1.5 caches read a timeout of None as the default timeout.
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class LRUCache(object):
+    """
+    In-process cache holding the maxsize most recently used records.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.keys_by_pk = {}
+        self.lock = threading.Lock()
+
+    def get(self, pk, key):
+        with self.lock:
+            try:
+                record = self.entries.pop((pk, key))
+            except KeyError:
+                return None
+            self.entries[(pk, key)] = record
+            return record
+
+    def set(self, pk, key, record):
+        with self.lock:
+            self.entries.pop((pk, key), None)
+            self.entries[(pk, key)] = record
+            self.keys_by_pk.setdefault(pk, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                (old_pk, old_key), _ = self.entries.popitem(last=False)
+                keys = self.keys_by_pk.get(old_pk)
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self.keys_by_pk[old_pk]
+
+    def invalidate(self, pk):
+        with self.lock:
+            for key in self.keys_by_pk.pop(pk, ()):
+                self.entries.pop((pk, key), None)
+
+
+class DjangoCache(object):
+    """
+    Cache backed by one of the CACHES configured in the Django settings.
+    Invalidation bumps a per-pk generation number that is part of every key.
+    Generations start from the current time, so that an expired generation
+    number can't bring back the entries of an earlier one.
+    """
+
+    def __init__(self, prefix, alias='default', timeout=None):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return get_cache(self.alias)
+
+    def generation_key(self, pk):
+        return '%s:%s:generation' % (self.prefix, pk)
+
+    def generation(self, pk):
+        generation_key = self.generation_key(pk)
+        generation = self.backend.get(generation_key)
+        if generation is None:
+            self.backend.add(generation_key, int(time.time() * 1000),
+                             GENERATION_TIMEOUT)
+            generation = self.backend.get(generation_key)
+        return generation
+
+    def make_key(self, pk, key):
+        generation = self.generation(pk)
+        return '%s:%s:%s:%s' % (self.prefix, pk, generation,
+                                ':'.join(str(k) for k in key))
+
+    def get(self, pk, key):
+        return self.backend.get(self.make_key(pk, key))
+
+    def set(self, pk, key, record):
+        self.backend.set(self.make_key(pk, key), record, self.timeout)
+
+    def invalidate(self, pk):
+        generation_key = self.generation_key(pk)
+        try:
+            self.backend.incr(generation_key)
+        except ValueError:
+            self.backend.set(generation_key, int(time.time() * 1000),
+                             GENERATION_TIMEOUT)
+
+
+def make_cache(cache):
+    """
+    Turn the cache argument of HistoricalRecords into a cache object: True
+    for a default LRUCache, an int for an LRUCache of that size, or a cache
+    object that is used as is.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return LRUCache()
+    if isinstance(cache, int):
+        return LRUCache(maxsize=cache)
+    return cache
@@ -0,0 +1,140 @@
+"""
+Consistency checks between live objects and their most recent version.
+
+find_drift() walks a model's live rows and the latest version of every
+object in its history side by side, in pk order and in bounded chunks, and
+reports the objects whose history doesn't match their current state (e.g.
+after raw SQL, queryset.update() or bulk_create()). repair() writes the
+historical records that bring the history back in line.
+"""
+from django.db import models
+
+from history.models import (CREATED, MODIFIED, DELETED, HistoryBatch,
+                            HistoricalIntegrityError, decode_snapshot)
+
+
+def get_value_names(model, attnames):
+    """
+    Return the names to pass to values()/values_list() for the given field
+    attnames of model.
+    """
+    names = dict((f.attname, f.name) for f in model._meta.fields)
+    return [names[attname] for attname in attnames]
+
+
+def latest_versions(history_model, low, high, attnames):
+    """
+    Return a {pk: (history_type, value, ...)} dict holding the most recent
+    version of every object whose pk lies in (low, high], with the values of
+    the given field attnames. None leaves the corresponding end of the range
+    open.
+    """
+    pk_name = history_model.primary_model._meta.pk.name
+    qs = history_model._default_manager.order_by()
+    if low is not None:
+        qs = qs.filter(**{'%s__gt' % pk_name: low})
+    if high is not None:
+        qs = qs.filter(**{'%s__lte' % pk_name: high})
+    latest = qs.values(pk_name).annotate(latest=models.Max('history_id'))
+    qs = history_model._default_manager\
+        .filter(history_id__in=[row['latest'] for row in latest])
+    if not hasattr(history_model, 'snapshot_fields'):
+        rows = qs.values_list(pk_name, 'history_type',
+                              *get_value_names(history_model, attnames))
+        return dict((row[0], row[1:]) for row in rows)
+
+    # The values of a snapshot history model are kept in its snapshot.
+    pk_attname = history_model.primary_model._meta.pk.attname
+    versions = {}
+    for pk, history_type, snapshot in qs.values_list(
+            pk_name, 'history_type', 'history_snapshot'):
+        values = decode_snapshot(history_model, snapshot)
+        values[pk_attname] = pk
+        versions[pk] = (history_type,) + \
+            tuple(values.get(name) for name in attnames)
+    return versions
+
+
+def find_drift(history_model, chunk_size=900):
+    """
+    Yield, per chunk of objects, a list of (pk, history_type) pairs naming
+    the objects that are out of sync with their history and the type of
+    record that would bring them back in sync. Like saves, the comparison
+    leaves out the fields in ignore_changes.
+    """
+    model = history_model.primary_model
+    pk_name = model._meta.pk.name
+    attnames = history_model.version_differ.attnames
+    pk_index = attnames.index(model._meta.pk.attname)
+    live_qs = model._default_manager.order_by(pk_name)\
+        .values_list(*get_value_names(model, attnames))
+    history_pks_qs = history_model._default_manager.order_by(pk_name)\
+        .values_list(pk_name, flat=True).distinct()
+
+    last = None
+    while True:
+        live, history_pks = live_qs, history_pks_qs
+        if last is not None:
+            live = live.filter(**{'%s__gt' % pk_name: last})
+            history_pks = history_pks.filter(**{'%s__gt' % pk_name: last})
+        live = list(live[:chunk_size])
+        history_pks = list(history_pks[:chunk_size])
+        if not live and not history_pks:
+            return
+
+        # Only compare the pk range both sides have been read up to.
+        bounds = []
+        if len(live) == chunk_size:
+            bounds.append(live[-1][pk_index])
+        if len(history_pks) == chunk_size:
+            bounds.append(history_pks[-1])
+        high = min(bounds) if bounds else None
+        if high is not None:
+            live = [row for row in live if row[pk_index] <= high]
+
+        expected = latest_versions(history_model, last, high, attnames)
+        drift = []
+        for row in live:
+            pk = row[pk_index]
+            version = expected.pop(pk, None)
+            if version is None or version[0] == DELETED:
+                drift.append((pk, CREATED))
+            elif version[1:] != row:
+                drift.append((pk, MODIFIED))
+        for pk, version in expected.items():
+            if version[0] != DELETED:
+                drift.append((pk, DELETED))
+        drift.sort()
+        yield drift
+
+        if high is None:
+            return
+        last = high
+
+
+def repair(history_model, drift, editor=None):
+    """
+    Write the historical records named by a list of (pk, history_type)
+    pairs from find_drift(), with one bulk insert.
+    """
+    model = history_model.primary_model
+    records = history_model.historical_records
+    live_pks = [pk for pk, history_type in drift if history_type != DELETED]
+    deleted_pks = [pk for pk, history_type in drift if history_type == DELETED]
+    live = model._default_manager.in_bulk(live_pks)
+    latest = []
+    if deleted_pks:
+        manager = getattr(model, records.manager_name)
+        latest = history_model._default_manager.filter(
+            history_id__in=manager._latest_ids(deleted_pks).values())
+
+    with HistoryBatch():
+        for pk, history_type in drift:
+            if history_type != DELETED and pk in live:
+                records.create_historical_record(live[pk], editor, history_type)
+        for version in latest:
+            try:
+                records.create_historical_record(version.history_object,
+                                                 editor, DELETED)
+            except HistoricalIntegrityError:
+                pass
@@ -0,0 +1,119 @@
+"""
+Field comparison for historical records.
+
+A HistoryDiffer is built once per history model. It resolves a comparator
+and the verbose name for every tracked field up front, so comparing two
+versions is a single pass over a precomputed plan.
+"""
+import decimal
+import json
+import operator
+
+from django.db import models
+from django.utils import timezone
+
+
+class HistoryChange(object):
+    __slots__ = ('name', 'from_value', 'to_value', 'verbose_name')
+
+    def __init__(self, name, from_value, to_value, verbose_name):
+        self.name = name
+        self.from_value = from_value
+        self.to_value = to_value
+        self.verbose_name = verbose_name
+
+    def __unicode__(self):
+        return 'Field "%s" changed from "%s" to "%s"' % \
+            (self.name, self.from_value, self.to_value)
+
+
+def decimals_differ(a, b):
+    if a is None or b is None:
+        return a is not b
+    try:
+        return decimal.Decimal(str(a)) != decimal.Decimal(str(b))
+    except decimal.InvalidOperation:
+        return a != b
+
+
+def datetimes_differ(a, b):
+    if a is None or b is None:
+        return a is not b
+    if timezone.is_aware(a) != timezone.is_aware(b):
+        # Values coming from the database and values assigned in code don't
+        # always agree on awareness; compare them in the default timezone.
+        tz = timezone.get_default_timezone()
+        if timezone.is_aware(a):
+            a = timezone.make_naive(a, tz)
+        else:
+            b = timezone.make_naive(b, tz)
+    return a != b
+
+
+def texts_differ(a, b):
+    if a == b:
+        return False
+    if not a or not b or a[:1] not in '{[' or b[:1] not in '{[':
+        return True
+    # JSON stored in text columns is only changed if its parsed value is.
+    try:
+        return json.loads(a) != json.loads(b)
+    except ValueError:
+        return True
+
+
+def get_comparator(field, json_aware=False):
+    """
+    Return a function (a, b) -> bool telling whether two values of field
+    differ. With json_aware, text fields holding equivalent JSON don't.
+    """
+    if isinstance(field, models.DecimalField):
+        return decimals_differ
+    if isinstance(field, models.DateTimeField):
+        return datetimes_differ
+    if json_aware and isinstance(field, models.TextField):
+        return texts_differ
+    return operator.ne
+
+
+class HistoryDiffer(object):
+    """
+    Compares versions field by field. A json_aware differ ignores changes
+    to the formatting of JSON stored in text fields; it is only meant for
+    reporting changes, as such a change still alters the stored row.
+    """
+    def __init__(self, fields, json_aware=False):
+        self.plan = [(f.attname, f.verbose_name, get_comparator(f, json_aware))
+                     for f in fields]
+        self.verbose_names = dict((name, verbose_name)
+                                  for name, verbose_name, _ in self.plan)
+
+    @property
+    def attnames(self):
+        return [name for name, _, _ in self.plan]
+
+    def differs(self, old, new):
+        """
+        Return True if any tracked field differs between old and new.
+        """
+        for name, _, differ in self.plan:
+            if differ(getattr(old, name), getattr(new, name)):
+                return True
+        return False
+
+    def changes(self, old, new):
+        """
+        Return a list of HistoryChange records for the fields that differ
+        between old and new. With no old version every field is reported.
+        """
+        if old is None:
+            return [HistoryChange(name, None, getattr(new, name), verbose_name)
+                    for name, verbose_name, _ in self.plan]
+        changes = []
+        for name, verbose_name, differ in self.plan:
+            from_value = getattr(old, name)
+            to_value = getattr(new, name)
+            if differ(from_value, to_value):
+                changes.append(HistoryChange(name, from_value, to_value,
+                                             verbose_name))
+        return changes
@@ -0,0 +1,244 @@
+"""
+Ordered views over the history tables of several tracked models: a change
+feed that follows new records as they are written, and a timeline of past
+records, newest first.
+
+    >>> from history.feed import ChangeFeed
+    >>> feed = ChangeFeed(cursor=load_saved_cursor())
+    >>> for record in feed.poll():
+    ...     reindex(record.history_object)
+    >>> save_cursor(feed.cursor)
+
+    >>> from history.feed import timeline
+    >>> recent = itertools.islice(timeline(editor=user), 50)
+
+Each poll seeks every history table past the last history_id it has seen,
+so a poll costs one primary key range scan per table no matter how large
+the tables have grown. Timelines page through every table the same way.
+
+Because the cursor only remembers the highest history_id read from each
+table, a record written by a transaction that commits after a record with
+a higher id has been polled is never seen by the feed. Consumers that must
+see every record (search indexes, cache invalidation) should give the feed
+a lag longer than their transactions last: records written more recently
+are then held back until a later poll.
+
+    >>> feed = ChangeFeed(cursor, lag=datetime.timedelta(seconds=30))
+"""
+import base64
+import datetime
+import heapq
+import itertools
+import json
+import time
+
+from django.utils import timezone
+
+from history.backends import require_table, uses_table
+from history.models import HistoricalRecords
+
+
+def history_model_label(history_model):
+    return '%s.%s' % (history_model._meta.app_label,
+                      history_model._meta.object_name)
+
+
+def encode_feed_cursor(positions):
+    data = json.dumps(positions, sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_feed_cursor(cursor):
+    try:
+        positions = json.loads(
+            base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid feed cursor: %r' % (cursor,))
+    if not isinstance(positions, dict):
+        raise ValueError('Invalid feed cursor: %r' % (cursor,))
+    return positions
+
+
+def get_history_models(models=None):
+    """
+    Return the history models of the given primary models, or of every
+    registered model if models is None. Feeds read history tables, so models
+    whose history is stored elsewhere are left out, or rejected if given.
+    """
+    HistoricalRecords.build_pending()
+    registered = HistoricalRecords.REGISTRY.values()
+    if models is not None:
+        registered = [r for r in registered if r[0] in models]
+        for model, manager_name, history_model in registered:
+            require_table(history_model, 'A history feed')
+    return sorted([r[2] for r in registered if uses_table(r[2])],
+                  key=history_model_label)
+
+
+def merge_records(streams, reverse=False):
+    """
+    Merge (label, records) streams of history records, each ordered by
+    history_date and history_id, into a single stream with the same ordering
+    (newest first when reverse is True).
+    """
+    def keyed(label, records):
+        for record in records:
+            key = (record.history_date, label, record.history_id)
+            yield (Descending(key) if reverse else key), record
+
+    keyed_streams = [keyed(label, records) for label, records in streams]
+    for key, record in heapq.merge(*keyed_streams):
+        yield record
+
+
+def merge_by_id(streams):
+    """
+    Merge (label, records) streams of history records, each ordered by
+    history_id, into a single stream of (key, record) pairs ordered by key.
+
+    Within a table, history_id and history_date don't always agree (e.g.
+    with transactions committing out of order, or backfilled records), so
+    the key of a record holds the latest history_date seen in its stream
+    so far rather than its own. This keeps every stream ordered by key, and
+    the merge ordered by date wherever the tables are.
+    """
+    def keyed(label, records):
+        latest = None
+        for record in records:
+            if latest is None or record.history_date > latest:
+                latest = record.history_date
+            yield (latest, label, record.history_id), record
+
+    return heapq.merge(*[keyed(label, records) for label, records in streams])
+
+
+class Descending(object):
+    """
+    Sort key wrapper inverting the order of the wrapped key.
+    """
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+class ChangeFeed(object):
+    """
+    Parameters:
+    - (optional) cursor: a cursor previously read from ChangeFeed.cursor;
+                         without it the feed starts at the beginning of
+                         history.
+    - (optional) models: only follow the history of these primary models.
+    - (optional) batch_size: the maximum number of records per poll.
+    - (optional) lag: a timedelta; records written less than lag ago, and
+                      the records of their table after them, are left for
+                      a later poll (see the module docstring).
+    """
+
+    def __init__(self, cursor=None, models=None, batch_size=500,
+                 lag=datetime.timedelta(0)):
+        self.positions = decode_feed_cursor(cursor) if cursor else {}
+        self.models = models
+        self.batch_size = batch_size
+        self.lag = lag
+
+    @property
+    def cursor(self):
+        return encode_feed_cursor(self.positions)
+
+    def poll(self):
+        """
+        Return the next batch of history records across all followed models,
+        and advance the cursor past them. Each model's records come in
+        history_id order, merged by history_date (see merge_by_id()).
+        """
+        streams = []
+        horizon = None
+        cutoff = timezone.now() - self.lag if self.lag else None
+        for history_model in get_history_models(self.models):
+            label = history_model_label(history_model)
+            records = list(history_model._default_manager
+                           .select_related('history_editor')
+                           .filter(history_id__gt=self.positions.get(label, 0))
+                           .order_by('history_id')[:self.batch_size])
+            if len(records) == self.batch_size:
+                # This table may hold more records than we fetched, so
+                # nothing ordered after its last record can be emitted yet.
+                key = (max(r.history_date for r in records), label,
+                       records[-1].history_id)
+                horizon = key if horizon is None else min(horizon, key)
+            if cutoff is not None:
+                # The cursor can't skip a record, so stop at the first one
+                # that is too recent.
+                records = list(itertools.takewhile(
+                    lambda r: r.history_date <= cutoff, records))
+            streams.append((label, records))
+
+        batch = []
+        for key, record in merge_by_id(streams):
+            if len(batch) == self.batch_size or \
+                    (horizon is not None and key > horizon):
+                break
+            batch.append(record)
+            self.positions[key[1]] = record.history_id
+        return batch
+
+    def follow(self, interval=1.0):
+        """
+        Yield history records forever, polling every interval seconds once
+        the feed has caught up.
+        """
+        while True:
+            batch = self.poll()
+            for record in batch:
+                yield record
+            if len(batch) < self.batch_size:
+                time.sleep(interval)
+
+
+def history_stream(history_model, page_size=100, **filters):
+    """
+    Yield the records of one history model, newest first by history_date
+    and history_id, fetching them a page at a time with
+    HistoryManager.by_date().
+    """
+    records = history_model.historical_records
+    manager = getattr(history_model.primary_model, records.manager_name)
+    return manager.by_date(page_size, **filters)
+
+
+def timeline(models=None, page_size=100, **filters):
+    """
+    Yield the history records of the given primary models (of every tracked
+    model by default), newest first, merged into a single timeline. Keyword
+    arguments filter the records like HistoryManager.page() does, e.g.
+    editor=user or start=date.
+
+    Records are pulled from each history table one page at a time, so
+    reading the first entries of the timeline only costs one query per
+    table, however long the history is.
+    """
+    streams = [(history_model_label(history_model),
+                history_stream(history_model, page_size, **filters))
+               for history_model in get_history_models(models)]
+    return merge_records(streams, reverse=True)
+
+
+def by_editor(editor, start=None, end=None, models=None, page_size=100):
+    """
+    Yield the history records made by editor within [start, end) across the
+    given primary models (every tracked model by default), newest first.
+    """
+    streams = []
+    for history_model in get_history_models(models):
+        manager = getattr(history_model.primary_model,
+                          history_model.historical_records.manager_name)
+        streams.append((history_model_label(history_model),
+                        manager.by_editor(editor, start, end, page_size)))
+    return merge_records(streams, reverse=True)
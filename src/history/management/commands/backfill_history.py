@@ -0,0 +1,124 @@
+import json
+import multiprocessing
+import os
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from history.models import CREATED, HistoryBatch
+from history.utils import get_registered_models
+
+
+def close_connections():
+    """
+    Worker processes must not share the database connections they inherit.
+    """
+    for connection in connections.all():
+        connection.close()
+
+
+def backfill_range(label, low, high):
+    """
+    Create a CREATED record for every object of the model labelled label
+    whose pk lies in [low, high] and that has no history yet. Returns the
+    number of records created.
+    """
+    (model, manager_name, history_model), = get_registered_models([label])
+    records = history_model.historical_records
+    pk_name = model._meta.pk.name
+    pk_range = {'%s__gte' % pk_name: low, '%s__lte' % pk_name: high}
+
+    existing = set(history_model._default_manager.filter(**pk_range)
+                   .values_list(pk_name, flat=True).distinct())
+    created = 0
+    with HistoryBatch():
+        for obj in model._default_manager.filter(**pk_range).iterator():
+            if obj.pk not in existing:
+                records.create_historical_record(obj, None, CREATED)
+                created += 1
+    return label, high, created
+
+
+def backfill_range_star(args):
+    return backfill_range(*args)
+
+
+class Command(BaseCommand):
+    help = "Create initial historical records for existing objects that " \
+           "don't have any history yet."
+    args = '[app_label.ModelName ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=1000,
+                    help='Number of objects handled per bulk insert.'),
+        make_option('--processes', type='int', default=1,
+                    help='Number of worker processes.'),
+        make_option('--checkpoint',
+                    help='File recording the progress of each model, so '
+                         'that an interrupted backfill can be resumed.'),
+    )
+
+    def handle(self, *labels, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        self.checkpoint = options.get('checkpoint')
+        self.progress = {}
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as f:
+                self.progress = json.load(f)
+
+        processes = options['processes']
+        pool = None
+        if processes > 1:
+            close_connections()
+            pool = multiprocessing.Pool(processes, initializer=close_connections)
+        try:
+            for model, manager_name, history_model in get_registered_models(labels):
+                label = '%s.%s' % (model._meta.app_label,
+                                   model._meta.object_name)
+                self.backfill(pool, model, label, options['chunk_size'])
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def chunks(self, model, label, chunk_size):
+        """
+        Yield (label, low, high) pk ranges covering the model's objects,
+        starting after the checkpointed pk.
+        """
+        last = self.progress.get(label)
+        pks = model._default_manager.order_by('pk').values_list('pk', flat=True)
+        while True:
+            chunk = pks.filter(pk__gt=last) if last is not None else pks
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return
+            last = chunk[-1]
+            yield label, chunk[0], last
+
+    def backfill(self, pool, model, label, chunk_size):
+        chunks = self.chunks(model, label, chunk_size)
+        if pool is not None:
+            results = pool.imap(backfill_range_star, chunks)
+        else:
+            results = (backfill_range(*chunk) for chunk in chunks)
+
+        total = 0
+        # Results arrive in pk order, so every one of them moves the
+        # checkpoint forward past a fully processed range.
+        for label, high, created in results:
+            total += created
+            self.progress[label] = high
+            self.save_checkpoint()
+            if self.verbosity > 1:
+                self.stdout.write('%s: up to pk %s, %d records created\n' %
+                                  (label, high, total))
+        if self.verbosity:
+            self.stdout.write('%s: %d records created\n' % (label, total))
+
+    def save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        with open(self.checkpoint + '.tmp', 'w') as f:
+            json.dump(self.progress, f)
+        os.rename(self.checkpoint + '.tmp', self.checkpoint)
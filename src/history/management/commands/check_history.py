@@ -0,0 +1,41 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from history.consistency import find_drift, repair
+from history.models import HISTORY_TYPES
+from history.utils import get_registered_models
+
+
+class Command(BaseCommand):
+    help = "Check that the most recent historical record of every object " \
+           "matches its current state, and optionally repair the history."
+    args = '[app_label.ModelName ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=900,
+                    help='Number of objects compared at once.'),
+        make_option('--repair', action='store_true', default=False,
+                    help='Write historical records for the objects that '
+                         'are out of sync.'),
+    )
+
+    def handle(self, *labels, **options):
+        verbosity = int(options.get('verbosity', 1))
+        type_names = dict(HISTORY_TYPES)
+        for model, manager_name, history_model in get_registered_models(labels):
+            total = 0
+            for drift in find_drift(history_model, options['chunk_size']):
+                if not drift:
+                    continue
+                total += len(drift)
+                if verbosity > 1:
+                    for pk, history_type in drift:
+                        self.stdout.write('%s(pk=%s): missing %s record\n' % (
+                            model._meta.object_name, pk,
+                            type_names[history_type].lower()))
+                if options['repair']:
+                    repair(history_model, drift)
+            if verbosity:
+                self.stdout.write('%s: %d objects out of sync%s\n' % (
+                    model._meta.object_name, total,
+                    ' (repaired)' if options['repair'] and total else ''))
@@ -0,0 +1,31 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from history.retention import prune
+from history.utils import get_registered_models
+
+
+class Command(BaseCommand):
+    help = "Delete historical records according to the retention policies " \
+           "of their HistoricalRecords."
+    args = '[app_label.ModelName ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=900,
+                    help='Number of objects whose history is pruned at once.'),
+        make_option('--batch-size', type='int', default=500,
+                    help='Maximum number of rows removed per DELETE.'),
+    )
+
+    def handle(self, *labels, **options):
+        verbosity = int(options.get('verbosity', 1))
+        for model, manager_name, history_model in get_registered_models(labels):
+            policies = history_model.historical_records.retention
+            if not policies:
+                continue
+            deleted = prune(history_model, policies,
+                            chunk_size=options['chunk_size'],
+                            batch_size=options['batch_size'])
+            if verbosity:
+                self.stdout.write('%s: deleted %d historical records\n' %
+                                  (history_model._meta.object_name, deleted))
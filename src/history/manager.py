@@ -1,4 +1,51 @@
-from django.db import models
+import base64
+import datetime
+import numbers
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models
+from django.db.backends.util import typecast_timestamp
+from django.utils import timezone
+
+from history.backends import require_table, uses_table
+from history.cache import CACHE_MIN_AGE
+from django.db.models.deletion import Collector
+
+
+def encode_cursor(history_id):
+    """
+    Return an opaque pagination cursor pointing just past history_id.
+    """
+    return base64.urlsafe_b64encode(('h%d' % history_id).encode('ascii'))\
+        .decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Return the history_id encoded in a cursor from encode_cursor(). Plain
+    history_id integers are accepted as well.
+    """
+    if isinstance(cursor, numbers.Integral):
+        return cursor
+    try:
+        value = base64.urlsafe_b64decode(str(cursor)).decode('ascii')
+        if not value.startswith('h'):
+            raise ValueError
+        return int(value[1:])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid history cursor: %r' % (cursor,))
+
+
+def drop_repeated_values(rows):
+    """
+    Yield the (date, value) rows whose value differs from the previous row.
+    """
+    last = missing = object()
+    for date, value in rows:
+        if last is missing or value != last:
+            yield date, value
+        last = value
 
 
 class HistoryDescriptor(object):
@@ -9,6 +56,109 @@ class HistoryDescriptor(object):
         return HistoryManager(self.model, owner, instance)
 
 
+class LazyHistoryDescriptor(object):
+    """
+    Stands in for a HistoryDescriptor until the history model is first used.
+    """
+    def __init__(self, records, model):
+        self.records = records
+        self.model = model
+
+    def __get__(self, instance, owner):
+        history_model = self.records.get_history_model(self.model)
+        return HistoryDescriptor(history_model).__get__(instance, owner)
+
+
+def get_record_class(history_model):
+    """
+    Return the namedtuple class of the lightweight records of history_model:
+    its metadata followed by the tracked fields, by attname.
+    """
+    record_class = history_model.__dict__.get('record_class')
+    if record_class is None:
+        names = ['history_id', 'history_date', 'history_type',
+                 'history_editor_id'] + history_model.important_field_names
+        record_class = namedtuple('%sRecord' % history_model.__name__, names)
+        history_model.record_class = record_class
+    return record_class
+
+
+class HistoryQuerySet(models.query.QuerySet):
+    def with_editors(self):
+        """
+        Join the editor of each record in, for listings that show who made
+        each change, rather than paying a query per record.
+        """
+        return self.select_related('history_editor')
+
+    def as_records(self, chunk_size=None):
+        """
+        Iterate over the matching versions as namedtuples of their metadata
+        and field values, read straight from the cursor without creating
+        model instances.
+
+          >>> for r in Obj.history.filter(history_date__gte=day).as_records():
+          ...     writer.writerow(r)
+
+        With chunk_size, versions are fetched chunk_size at a time, newest
+        first, each chunk seeking past the previous one by history_id, for
+        exports that shouldn't hold a whole result set in memory.
+        """
+        history_model = self.model._meta.concrete_model
+        record_class = get_record_class(history_model)
+        value_names = dict((f.attname, f.name)
+                           for f in history_model._meta.fields)
+        stored = history_model.stored_field_names
+        names = ['history_id', 'history_date', 'history_type',
+                 'history_editor'] + [value_names[name] for name in stored]
+
+        if chunk_size is None:
+            rows = self.values_list(*names).iterator()
+        else:
+            rows = self._chunked_values(names, chunk_size)
+
+        if not hasattr(history_model, 'snapshot_fields'):
+            for row in rows:
+                yield record_class._make(row)
+            return
+
+        from history.models import decode_snapshot
+        for row in rows:
+            values = dict(zip(stored, row[4:]))
+            values.update(decode_snapshot(history_model,
+                                          values.pop('history_snapshot')))
+            yield record_class._make(
+                row[:4] + tuple(values.get(name) for name
+                                in history_model.important_field_names))
+
+    def _chunked_values(self, names, chunk_size):
+        qs = self.order_by('-history_id')
+        last = None
+        while True:
+            chunk = qs
+            if last is not None:
+                chunk = chunk.filter(history_id__lt=last)
+            rows = list(chunk.values_list(*names)[:chunk_size])
+            for row in rows:
+                yield row
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1][0]
+
+
+class MetadataQuerySet(HistoryQuerySet):
+    """
+    QuerySet whose records remember the other records fetched with them, so
+    that their deferred fields can be loaded together.
+    """
+    def iterator(self):
+        group = []
+        for record in super(MetadataQuerySet, self).iterator():
+            record._deferred_group = group
+            group.append(record)
+            yield record
+
+
 class HistoryManager(models.Manager):
     def __init__(self, model, primary_model, instance=None):
         super(HistoryManager, self).__init__()
@@ -17,14 +167,88 @@ class HistoryManager(models.Manager):
         self.instance = instance
 
     def get_query_set(self):
-        qs = super(HistoryManager, self).get_query_set()
+        qs = HistoryQuerySet(self.model, using=self._db)
         if self.instance:
             qs = self._filter_queryset_by_pk(qs, self.instance.pk)
         return qs
 
+    def with_editors(self):
+        return self.get_query_set().with_editors()
+
+    def as_records(self, chunk_size=None):
+        require_table(self.model, 'as_records()')
+        return self.get_query_set().as_records(chunk_size)
+
     def _filter_queryset_by_pk(self, qs, pk):
         return qs.filter(**{self.primary_model._meta.pk.name: pk})
 
+    def metadata_only(self):
+        """
+        Return a queryset of history records that only loads their metadata
+        (history_id, history_date, history_type, history_editor) and the
+        primary key, for listings of wide models. The other fields of all
+        listed records are loaded with a single query once history_object or
+        modified_fields is used on any of them.
+
+          >>> [(r.history_date, r.history_editor)
+          ...  for r in obj.history.metadata_only()]
+        """
+        require_table(self.model, 'metadata_only()')
+        qs = self.get_query_set()._clone(klass=MetadataQuerySet)
+        return qs.only('history_id', 'history_date', 'history_type',
+                       'history_editor', self.primary_model._meta.pk.name)
+
+    def _latest_ids(self, pks=None, date=None):
+        """
+        Return a {pk: history_id} dict mapping each primary key to its most
+        recent version (as of date, if given), using one grouped query.
+        """
+        require_table(self.model, 'This lookup')
+        pk_name = self.primary_model._meta.pk.name
+        qs = self.get_query_set()
+        if pks is not None:
+            qs = qs.filter(**{'%s__in' % pk_name: pks})
+        if date is not None:
+            qs = qs.filter(history_date__lte=date)
+        rows = qs.order_by().values(pk_name)\
+            .annotate(latest=models.Max('history_id'))
+        return dict((row[pk_name], row['latest']) for row in rows)
+
+    def _cached(self, pk, key, lookup):
+        """
+        Return the record for (pk, key) from the history cache, calling
+        lookup() to find it on a cache miss.
+        """
+        cache = self.model.historical_records.cache
+        if cache is None:
+            return lookup()
+        record = cache.get(pk, key)
+        if record is None:
+            record = lookup()
+            cache.set(pk, key, record)
+        return record
+
+    def _cacheable(self, date):
+        """
+        Return True if the as_of() lookup of date can be cached: versions
+        dated around now may still be committed or rolled back, by this
+        process or another one.
+        """
+        if not isinstance(date, datetime.datetime):
+            date = datetime.datetime.combine(date, datetime.time())
+        now = timezone.now() if timezone.is_aware(date) \
+            else datetime.datetime.now()
+        return date < now - CACHE_MIN_AGE
+
+    def latest_version(self, pk=None):
+        """
+        Return the most recent historical record of the instance (or of the
+        object matching pk), or None. Always read from the backend, never
+        from the cache, as it decides whether a save creates a new version.
+        """
+        pk = self.instance.pk if self.instance else pk
+        return self.model.historical_records.backend.latest(self, pk)
+
     def most_recent(self, pk=None):
         """
         If called with an instance, returns the most recent copy of the instance
@@ -40,17 +264,12 @@ class HistoryManager(models.Manager):
           >>> Obj.history.most_recent(pk=1)
           <Obj...>
         """
-        pk = self.instance.pk if self.instance else pk
-        qs = self._filter_queryset_by_pk(self.get_query_set(), pk)
-
-        try:
-            version = qs[0]
-        except IndexError:
+        version = self.latest_version(pk)
+        if version is None:
             message = "%s(pk=%s) has no historical record." % \
                 (self.primary_model.__name__, pk)
             raise self.primary_model.DoesNotExist(message)
-        else:
-            return version.history_object
+        return version.history_object
 
     def as_of(self, date, pk=None, restore=False):
         """
@@ -69,27 +288,227 @@ class HistoryManager(models.Manager):
           <Obj...>
         """
         pk = self.instance.pk if self.instance else pk
-        qs = self._filter_queryset_by_pk(self.get_query_set(), pk)
+        backend = self.model.historical_records.backend
 
-        try:
-            version = qs.filter(history_date__lte=date)[0]
-        except IndexError:
+        lookup = lambda: backend.latest(self, pk, date)
+        if self.model.historical_records.cache is not None and \
+                self._cacheable(date):
+            version = self._cached(pk, ('as_of', date.isoformat()), lookup)
+        else:
+            version = lookup()
+        if version is None:
             message = "%s(pk=%s) had not yet been created." % \
                 (self.primary_model.__name__, pk)
             raise self.primary_model.DoesNotExist(message)
-        else:
-            from history.models import DELETED
-            if version.history_type == DELETED and not restore:
-                message = "%s(pk=%s) had already been deleted." % \
-                    (self.primary_model.__name__, pk)
-                raise self.primary_model.DoesNotExist(message)
-            return version.history_object
+        from history.models import DELETED
+        if version.history_type == DELETED and not restore:
+            message = "%s(pk=%s) had already been deleted." % \
+                (self.primary_model.__name__, pk)
+            raise self.primary_model.DoesNotExist(message)
+        return version.history_object
+
+    def versions(self, pk=None):
+        """
+        Iterate over the historical records of the instance (or of the object
+        matching pk, or of every object), newest first, from whichever backend
+        stores them.
+
+          >>> [v.history_date for v in obj.history.versions()]
+        """
+        pk = self.instance.pk if self.instance else pk
+        return self.model.historical_records.backend.versions(self, pk)
+
+    def page(self, after=None, limit=50, pk=None, editor=None,
+             start=None, end=None, **filters):
+        """
+        Return a (records, cursor) tuple holding up to limit history records,
+        newest first, and an opaque cursor for the next page (None when there
+        are no more records). Records can be filtered by primary key, editor,
+        a [start, end) date range and any other lookups passed as keyword
+        arguments.
+
+          >>> records, cursor = Obj.history.page(limit=100)
+          >>> records, cursor = Obj.history.page(after=cursor, limit=100)
+
+        Pages are seeked by history_id instead of sliced by offset, so a deep
+        page costs the same index range scan as the first one.
+        """
+        require_table(self.model, 'page()')
+        qs = self._filter_records(self.with_editors(), pk, editor, start, end,
+                                  filters).order_by('-history_id')
+        if after is not None:
+            qs = qs.filter(history_id__lt=decode_cursor(after))
+
+        records = list(qs[:limit + 1])
+        if len(records) > limit:
+            records = records[:limit]
+            return records, encode_cursor(records[-1].history_id)
+        return records, None
+
+    def _filter_records(self, qs, pk, editor, start, end, filters):
+        if pk is not None:
+            qs = self._filter_queryset_by_pk(qs, pk)
+        if editor is not None:
+            qs = qs.filter(history_editor=editor)
+        if start is not None:
+            qs = qs.filter(history_date__gte=start)
+        if end is not None:
+            qs = qs.filter(history_date__lt=end)
+        if filters:
+            qs = qs.filter(**filters)
+        return qs
+
+    def by_editor(self, editor, start=None, end=None, page_size=100):
+        """
+        Yield the history records made by editor within [start, end), newest
+        first.
+
+          >>> last_week = Obj.history.by_editor(user, start=week_ago)
+
+        Records are fetched page_size at a time, each page seeking past the
+        previous one on the (history_editor, history_date) index.
+        """
+        require_table(self.model, 'by_editor()')
+        return self.by_date(page_size, editor=editor, start=start, end=end)
+
+    def by_date(self, page_size=100, pk=None, editor=None, start=None,
+                end=None, **filters):
+        """
+        Yield history records ordered by history_date and history_id, newest
+        first, filtered like page() does. Unlike page(), which follows
+        history_id, the order holds where records were written out of date
+        order (e.g. by concurrent transactions or a backfill).
+
+        Records are fetched page_size at a time, each page seeking past the
+        previous one on (history_date, history_id).
+        """
+        require_table(self.model, 'by_date()')
+        qs = self._filter_records(self.with_editors(), pk, editor, start, end,
+                                  filters)\
+            .order_by('-history_date', '-history_id')
+        return self._seek_by_date(qs, page_size)
+
+    def _seek_by_date(self, qs, page_size):
+        last = None
+        while True:
+            page = qs
+            if last is not None:
+                page = page.filter(
+                    models.Q(history_date__lt=last.history_date) |
+                    models.Q(history_date=last.history_date,
+                             history_id__lt=last.history_id))
+            records = list(page[:page_size])
+            for record in records:
+                yield record
+            if len(records) < page_size:
+                return
+            last = records[-1]
+
+    def m2m_as_of(self, field_name, date, pk=None):
+        """
+        Return the set of related primary keys a tracked ManyToManyField held
+        on the date provided, replayed from its add/remove history with one
+        query.
+
+          >>> obj.history.m2m_as_of('tags', datetime.datetime(2000, 1, 1))
+          set([1, 4, 5])
+        """
+        from history.models import M2M_ADDED
+        pk = self.instance.pk if self.instance else pk
+        try:
+            m2m_model = self.model.m2m_history_models[field_name]
+        except KeyError:
+            raise ValueError("%s.%s is not a tracked ManyToManyField." %
+                             (self.primary_model._meta.object_name, field_name))
+        changes = m2m_model._default_manager\
+            .filter(object_id=pk, history_date__lte=date)\
+            .order_by('history_id').values_list('history_type', 'related_id')
+
+        members = set()
+        for history_type, related_id in changes:
+            if history_type == M2M_ADDED:
+                members.add(related_id)
+            else:
+                members.discard(related_id)
+        return members
+
+    def graph_as_of(self, date, follow=(), pk=None):
+        """
+        Like as_of(), but also rebuilds the objects reached through the
+        foreign keys named in follow as they were on the date provided.
+        Paths use the usual double underscore notation.
+
+          >>> invoice = obj.history.graph_as_of(date, follow=['customer',
+          ...                                                 'customer__address'])
+          >>> invoice.customer.address
+          <Address...>
+
+        Each step along the paths costs the same two queries however many
+        objects it covers. Related models without historical records are
+        loaded in their current state.
+        """
+        root = self.as_of(date, pk=pk)
+        tree = {}
+        for path in follow:
+            node = tree
+            for name in path.split('__'):
+                node = node.setdefault(name, {})
+        self._follow_as_of(self.primary_model, [root], tree, date)
+        return root
+
+    def _follow_as_of(self, model, objs, tree, date):
+        for name, subtree in tree.items():
+            field = model._meta.get_field(name)
+            if not isinstance(field, models.ForeignKey):
+                raise ValueError('%s.%s is not a foreign key.' %
+                                 (model._meta.object_name, name))
+            related_model = field.rel.to
+            if field.rel.field_name != related_model._meta.pk.name:
+                raise ValueError("Can't follow %s.%s, it doesn't reference a "
+                                 "primary key." % (model._meta.object_name,
+                                                   name))
+
+            pks = set(getattr(obj, field.attname) for obj in objs)
+            pks.discard(None)
+            related = self._objects_as_of(related_model, list(pks), date)
+            for obj in objs:
+                setattr(obj, field.get_cache_name(),
+                        related.get(getattr(obj, field.attname)))
+            if subtree and related:
+                self._follow_as_of(related_model, list(related.values()),
+                                   subtree, date)
+
+    def _objects_as_of(self, model, pks, date):
+        """
+        Return a {pk: instance} dict of the objects that existed on date.
+        """
+        from history.models import HistoricalRecords, DELETED
+        if not pks:
+            return {}
+        try:
+            model, manager_name, history_model = \
+                HistoricalRecords.REGISTRY[model._meta]
+        except KeyError:
+            return model._default_manager.in_bulk(pks)
+
+        latest = getattr(model, manager_name)._latest_ids(pks, date)
+        versions = history_model._default_manager\
+            .filter(history_id__in=list(latest.values()))
+        objects = {}
+        for version in versions:
+            if version.history_type != DELETED:
+                obj = version.history_object
+                objects[obj.pk] = obj
+        return objects
 
     @property
     def created_date(self):
         if not self.instance:
             raise TypeError("Can't use created_date() without a %s instance." % \
                                 self.primary_model._meta.object_name)
+        if not uses_table(self.model):
+            version = self._backend_version(first=True)
+            return version and version.history_date
         return self.aggregate(created=models.Min('history_date'))['created']
 
     @property
@@ -97,14 +516,19 @@ class HistoryManager(models.Manager):
         if not self.instance:
             raise TypeError("Can't use created_by() without a %s instance." % \
                                 self.primary_model._meta.object_name)
-        return self.order_by('history_date')[0].history_editor
+        if not uses_table(self.model):
+            version = self._backend_version(first=True)
+            return version and version.history_editor
+        return self.with_editors().order_by('history_date')[0].history_editor
 
     @property
     def last_modified_date(self):
         if not self.instance:
             raise TypeError("Can't use last_modified_date() without a %s instance." % \
                                 self.primary_model._meta.object_name)
-
+        if not uses_table(self.model):
+            version = self._backend_version(first=False)
+            return version and version.history_date
         return self.aggregate(modified=models.Max('history_date'))['modified']
 
     @property
@@ -112,7 +536,186 @@ class HistoryManager(models.Manager):
         if not self.instance:
             raise TypeError("Can't use last_modified_by() without a %s instance." % \
                                 self.primary_model._meta.object_name)
-        return self.order_by('-history_date')[0].history_editor
+        if not uses_table(self.model):
+            version = self._backend_version(first=False)
+            return version and version.history_editor
+        return self.with_editors().order_by('-history_date')[0].history_editor
+
+    def _backend_version(self, first):
+        """
+        Return the first or the latest version of the instance from a backend
+        other than the history table, or None.
+        """
+        backend = self.model.historical_records.backend
+        if not first:
+            return backend.latest(self, self.instance.pk)
+        version = None
+        for version in backend.versions(self, self.instance.pk):
+            pass
+        return version
+
+    def field_timeline(self, field_name, start=None, end=None, pk=None,
+                       dedupe=True, columns=False):
+        """
+        Iterate over the (history_date, value) pairs of one field of the
+        instance (or of the object matching pk), for the versions recorded in
+        [start, end), oldest first. With dedupe, consecutive versions that
+        left the value unchanged are skipped.
+
+          >>> list(obj.history.field_timeline('price', start=last_year))
+          [(datetime.datetime(2012, 1, 1, ...), Decimal('9.99')), ...]
+
+        With columns=True, a (dates, values) tuple of lists is returned
+        instead, e.g. for plotting. Only the two columns are fetched, so no
+        historical record is instantiated.
+        """
+        require_table(self.model, 'field_timeline()')
+        pk = self.instance.pk if self.instance else pk
+        attname = self.primary_model._meta.get_field(field_name).attname
+        if attname not in self.model.important_field_names:
+            raise ValueError("%s.%s is not a tracked field." %
+                             (self.primary_model._meta.object_name, field_name))
+        qs = self.get_query_set().order_by('history_date', 'history_id')
+        if pk is not None:
+            qs = self._filter_queryset_by_pk(qs, pk)
+        if start is not None:
+            qs = qs.filter(history_date__gte=start)
+        if end is not None:
+            qs = qs.filter(history_date__lt=end)
+
+        if attname in getattr(self.model, 'snapshot_fields', {}):
+            # The value is kept in the compressed snapshot.
+            qs = qs.only('history_date', 'history_snapshot',
+                         self.primary_model._meta.pk.name)
+            rows = ((record.history_date, getattr(record, attname))
+                    for record in qs.iterator())
+        else:
+            names = dict((f.attname, f.name) for f in self.model._meta.fields)
+            rows = qs.values_list('history_date', names[attname]).iterator()
+        if dedupe:
+            rows = drop_repeated_values(rows)
+
+        if not columns:
+            return rows
+        dates, values = [], []
+        for date, value in rows:
+            dates.append(date)
+            values.append(value)
+        return dates, values
+
+    def field_change_counts(self, start=None, end=None, group_by=None):
+        """
+        Count how many times each tracked field changed from one version to
+        the next, for versions recorded in [start, end). Returns a
+        {field_name: count} dict, or with group_by='editor' or 'day' a dict
+        mapping each editor id or day to such a dict.
+
+          >>> Obj.history.field_change_counts(group_by='day')
+          {datetime.date(2012, 1, 1): {'price': 12, 'title': 0}, ...}
+
+        Consecutive versions are paired up and compared by the database, so
+        no historical record is loaded.
+        """
+        require_table(self.model, 'field_change_counts()')
+        if hasattr(self.model, 'snapshot_fields'):
+            raise ImproperlyConfigured(
+                "field_change_counts() needs a column per field, which "
+                "%s doesn't have: its history is stored as snapshots." %
+                self.primary_model._meta.object_name)
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        pk_column = opts.get_field(self.primary_model._meta.pk.name).column
+        fields_by_attname = dict((f.attname, f) for f in opts.fields)
+        fields = [fields_by_attname[name]
+                  for name in self.model.important_field_names
+                  if name != self.primary_model._meta.pk.attname]
+
+        changed = []
+        for field in fields:
+            column = qn(field.column)
+            changed.append(
+                'SUM(CASE WHEN cur.%(c)s <> prev.%(c)s'
+                ' OR (cur.%(c)s IS NULL AND prev.%(c)s IS NOT NULL)'
+                ' OR (cur.%(c)s IS NOT NULL AND prev.%(c)s IS NULL)'
+                ' THEN 1 ELSE 0 END)' % {'c': column})
+
+        if group_by is None:
+            group_sql = None
+        elif group_by == 'editor':
+            group_sql = 'cur.%s' % qn(opts.get_field('history_editor').column)
+        elif group_by == 'day':
+            group_sql = connection.ops.date_trunc_sql(
+                'day', 'cur.%s' % qn('history_date'))
+        else:
+            raise ValueError("group_by must be None, 'editor' or 'day'.")
+
+        where, params = [], []
+        if start is not None:
+            where.append('cur.%s >= %%s' % qn('history_date'))
+            params.append(connection.ops.value_to_db_datetime(start))
+        if end is not None:
+            where.append('cur.%s < %%s' % qn('history_date'))
+            params.append(connection.ops.value_to_db_datetime(end))
+        if self.instance:
+            where.append('cur.%s = %%s' % qn(pk_column))
+            params.append(self.instance.pk)
+
+        sql = ('SELECT %(select)s FROM %(table)s cur'
+               ' INNER JOIN %(table)s prev ON prev.%(id)s = ('
+               'SELECT MAX(p.%(id)s) FROM %(table)s p'
+               ' WHERE p.%(pk)s = cur.%(pk)s AND p.%(id)s < cur.%(id)s)'
+               '%(where)s%(group)s') % {
+            'select': ', '.join(([group_sql] if group_sql else []) + changed),
+            'table': qn(opts.db_table),
+            'id': qn('history_id'),
+            'pk': qn(pk_column),
+            'where': ' WHERE ' + ' AND '.join(where) if where else '',
+            'group': ' GROUP BY %s' % group_sql if group_sql else '',
+        }
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+        names = [field.attname for field in fields]
+        if group_sql is None:
+            counts = rows[0] if rows else [None] * len(names)
+            return dict(zip(names, [int(count or 0) for count in counts]))
+
+        result = {}
+        for row in rows:
+            group = row[0]
+            if group_by == 'day':
+                if not hasattr(group, 'date'):
+                    group = typecast_timestamp(str(group))
+                group = group.date()
+            result[group] = dict(zip(names, [int(count or 0)
+                                             for count in row[1:]]))
+        return result
+
+    # Concurrent counterparts of the lookups above. They run on the worker
+    # pool of history.pool and return a concurrent.futures.Future, which
+    # asyncio code can await through asyncio.wrap_future().
+
+    def amost_recent(self, pk=None):
+        from history.pool import submit
+        return submit(self.most_recent, pk=pk)
+
+    def aas_of(self, date, pk=None, restore=False):
+        from history.pool import submit
+        return submit(self.as_of, date, pk=pk, restore=restore)
+
+    def apage(self, *args, **kwargs):
+        from history.pool import submit
+        return submit(self.page, *args, **kwargs)
+
+    def acreated_date(self):
+        from history.pool import submit
+        return submit(lambda: self.created_date)
+
+    def alast_modified_date(self):
+        from history.pool import submit
+        return submit(lambda: self.last_modified_date)
 
     def get_or_restore(self, pk):
         '''
@@ -128,6 +731,95 @@ class HistoryManager(models.Manager):
         except self.primary_model.DoesNotExist:
             return self.most_recent(pk=pk)
 
+    def restore_to(self, date, pks, editor=None, batch_size=500):
+        '''
+        Revert a set of objects to the state they were in on the date
+        provided. pks can be a list of primary keys or a queryset of the
+        primary model (note that a queryset can't select deleted objects).
+
+        Objects that didn't exist at that date are deleted, objects that
+        existed but are gone now are recreated and the remaining ones are
+        updated where their fields differ. The history records for those
+        changes are written with bulk inserts.
+
+        Returns a dict listing the primary keys that were 'created',
+        'modified' and 'deleted'.
+
+          >>> Obj.history.restore_to(datetime.datetime(2000, 1, 1), [1, 2, 3])
+          {'created': [3], 'modified': [1], 'deleted': []}
+
+        Wrap the call in a transaction if it has to be applied atomically.
+        '''
+        require_table(self.model, 'restore_to()')
+        if self.instance:
+            raise TypeError("Can't use restore_to() with a %s instance." %\
+                            self.instance._meta.object_name)
+        from history.models import HistoryBatch
+
+        if isinstance(pks, models.query.QuerySet):
+            pks = pks.values_list('pk', flat=True)
+        seen = set()
+        pks = [pk for pk in pks if not (pk in seen or seen.add(pk))]
+
+        report = {'created': [], 'modified': [], 'deleted': []}
+        for start in range(0, len(pks), batch_size):
+            with HistoryBatch():
+                self._restore_batch(date, pks[start:start + batch_size],
+                                    editor, report)
+        return report
+
+    def _restore_batch(self, date, pks, editor, report):
+        from history.models import CREATED, MODIFIED, DELETED
+        records = self.model.historical_records
+        opts = self.primary_model._meta
+        manager = self.primary_model._default_manager
+        field_names = [name for name in self.model.important_field_names
+                       if name != opts.pk.attname]
+        # update() takes field names, not attnames such as 'fk_id'
+        update_names = dict((f.attname, f.name) for f in opts.fields)
+
+        latest = self._latest_ids(pks, date).values()
+        targets = dict((getattr(version, opts.pk.attname), version)
+                       for version in self.model._default_manager
+                       .filter(history_id__in=latest))
+        live = manager.in_bulk(pks)
+
+        to_create, to_delete = [], []
+        for pk in pks:
+            target, current = targets.get(pk), live.get(pk)
+            if target is None or target.history_type == DELETED:
+                if current is not None:
+                    to_delete.append(current)
+                continue
+
+            restored = target.history_object
+            if current is None:
+                to_create.append(restored)
+            elif any(getattr(current, name) != getattr(restored, name)
+                     for name in field_names):
+                manager.filter(pk=pk).update(
+                    **dict((update_names[name], getattr(restored, name))
+                           for name in field_names))
+                records.create_historical_record(restored, editor, MODIFIED)
+                report['modified'].append(pk)
+
+        if to_create:
+            manager.bulk_create(to_create)
+            for obj in to_create:
+                records.create_historical_record(obj, editor, CREATED)
+                report['created'].append(obj.pk)
+
+        if to_delete:
+            # Delete the instances we already hold so that post_delete sees
+            # the editor; their history records join the current batch.
+            deleted_pks = [obj.pk for obj in to_delete]
+            collector = Collector(using=manager.db)
+            for obj in to_delete:
+                obj._history_editor = editor
+            collector.collect(to_delete)
+            collector.delete()
+            report['deleted'].extend(deleted_pks)
+
 
 class HistoricalAnnotatingManager(models.Manager):
 
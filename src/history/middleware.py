@@ -0,0 +1,29 @@
+from history.models import HistoryBatch
+
+
+class CollapseHistoryMiddleware(object):
+    """
+    Collapse the versions written while handling a request, so that an
+    object saved several times by one request gets a single version.
+
+    The version is written by the first save and updated in place by the
+    later ones (see HistoryBatch), so it commits or rolls back along with
+    the saves, whatever the transaction handling of the request.
+    """
+
+    def process_request(self, request):
+        request._history_batch = HistoryBatch(collapse=True)
+        request._history_batch.__enter__()
+
+    def process_response(self, request, response):
+        batch = getattr(request, '_history_batch', None)
+        if batch is not None:
+            del request._history_batch
+            batch.__exit__(None, None, None)
+        return response
+
+    def process_exception(self, request, exception):
+        batch = getattr(request, '_history_batch', None)
+        if batch is not None:
+            del request._history_batch
+            batch.__exit__(type(exception), exception, None)
@@ -1,15 +1,24 @@
+import base64
 import copy
+import json
+import threading
+import zlib
 from functools import wraps
 
 from django.contrib.auth.models import User
 import django.db
 from django.db import models
 from django.db.models.base import ModelBase
+from django.db.models.deletion import Collector
 from django.db.models.fields.related import add_lazy_relation
 from django.db.models.loading import app_cache_ready, AppCache
 from django.db.models.related import RelatedObject
+from django.utils import timezone
 
 from history import manager
+from history.backends import ModelBackend, encode_value
+from history.cache import make_cache
+from history.diff import HistoryChange, HistoryDiffer
 
 # Behaviors for foreign key conversion.
 PRESERVE = 1
@@ -24,17 +33,12 @@ HISTORY_TYPES = (
     (DELETED, 'Deleted')
 )
 
-
-class HistoryChange(object):
-    def __init__(self, name, from_value, to_value, verbose_name):
-        self.name = name
-        self.from_value = from_value
-        self.to_value = to_value
-        self.verbose_name = verbose_name
-
-    def __unicode__(self):
-        return 'Field "%s" changed from "%s" to "%s"' % \
-            (self.name, self.from_value, self.to_value)
+M2M_ADDED = '+'
+M2M_REMOVED = '-'
+M2M_HISTORY_TYPES = (
+    (M2M_ADDED, 'Added'),
+    (M2M_REMOVED, 'Removed'),
+)
 
 
 class HistoricalRecords(object):
@@ -50,22 +54,66 @@ class HistoricalRecords(object):
                          migrations, and table names.)
     - (optional) fields: a list of field names to be checked and saved. If
                          nothing is defined, all fields will be saved.
+    - (optional) m2m_fields: names of ManyToManyFields whose membership
+                             changes are recorded, as add/remove deltas in
+                             a separate history model per field.
+    - (optional) cache: cache the records found by as_of() for past dates;
+                        True or a size for an in-process LRU cache, or a
+                        cache object (see history.cache).
+    - (optional) retention: a retention policy or a list of them (see
+                            history.retention), enforced by the
+                            prune_history management command.
+    - (optional) lazy: defer building the history model until it is first
+                       used or the app cache is populated (syncdb,
+                       validation, get_models(), ...). Speeds up startup.
+    - (optional) backend: where historical records are stored; the history
+                          model's table by default (see history.backends).
+    - (optional) snapshot: store the tracked fields of each version in one
+                           compressed column instead of a column per field.
+                           Keeps the history table narrow for very wide
+                           models, but versions can't be filtered by field
+                           nor counted by field_change_counts().
+    - (optional) ignore_changes: names of fields that are saved in every
+                                 version but don't create a new version
+                                 when they are the only ones that changed.
+                                 A save(update_fields=...) touching only
+                                 these fields skips the change check.
     """
 
     # meta -> (model, manager_name, history_model)
     REGISTRY = {}
 
+    # meta -> (HistoricalRecords, model) for lazy history models not yet built
+    PENDING = {}
+
     def __init__(self,
                  module=None,
                  fields=None,
                  key_conversions=None,
                  add_history_properties=False,
-                 require_editor=False):
+                 require_editor=False,
+                 m2m_fields=None,
+                 cache=None,
+                 retention=None,
+                 lazy=False,
+                 backend=None,
+                 snapshot=False,
+                 ignore_changes=None):
         self._module = module
         self._fields = fields
         self.key_conversions = key_conversions or {}
         self.add_history_properties = add_history_properties
         self.require_editor = require_editor
+        self.m2m_fields = m2m_fields or []
+        self.cache = make_cache(cache)
+        if retention is not None and not isinstance(retention, (list, tuple)):
+            retention = [retention]
+        self.retention = list(retention or [])
+        self.lazy = lazy
+        self.backend = backend or ModelBackend()
+        self.snapshot = snapshot
+        self.ignore_changes = set(ignore_changes or [])
+        self._field_plans = {}
 
     def contribute_to_class(self, cls, name):
         self.manager_name = name
@@ -97,11 +145,18 @@ class HistoricalRecords(object):
                                          weak=False)
         models.signals.post_delete.connect(self.post_delete, sender=model,
                                            weak=False)
-
-        history_model = self.create_history_model(model)
-        descriptor = manager.HistoryDescriptor(history_model)
-        setattr(model, self.manager_name, descriptor)
+        for field_name in self.m2m_fields:
+            self.connect_m2m_changed(model, field_name)
+
+        if self.lazy:
+            descriptor = manager.LazyHistoryDescriptor(self, model)
+            setattr(model, self.manager_name, descriptor)
+            HistoricalRecords.PENDING[model._meta] = self, model
+            monkey_patch_app_cache()
+        else:
+            self.build_history_model(model)
         self.monkey_patch_name_map(model)
+        monkey_patch_collector()
 
         if self.add_history_properties:
             self.monkey_patch_history_properties(model)
@@ -111,11 +166,42 @@ class HistoricalRecords(object):
         self.capture_init(model)
         self.create_set_editor_method(model)
 
-        if model._meta in HistoricalRecords.REGISTRY:
-            AppCache().app_errors[model._meta] = 'Models cannot have more than one HistoricalRecords field.'
-        else:
-            regvalue = model, self.manager_name, history_model
-            HistoricalRecords.REGISTRY[model._meta] = regvalue
+    def build_history_model(self, model):
+        '''
+        Create the history model for model, install its descriptor and
+        register it. Returns the history model.
+        '''
+        with _build_lock:
+            HistoricalRecords.PENDING.pop(model._meta, None)
+            history_model = self.create_history_model(model)
+            descriptor = manager.HistoryDescriptor(history_model)
+            setattr(model, self.manager_name, descriptor)
+
+            if model._meta in HistoricalRecords.REGISTRY:
+                AppCache().app_errors[model._meta] = 'Models cannot have more than one HistoricalRecords field.'
+            else:
+                regvalue = model, self.manager_name, history_model
+                HistoricalRecords.REGISTRY[model._meta] = regvalue
+            return history_model
+
+    def get_history_model(self, model):
+        '''
+        Return the history model for model, building it if it is pending.
+        '''
+        with _build_lock:
+            if model._meta in HistoricalRecords.PENDING:
+                return self.build_history_model(model)
+            return HistoricalRecords.REGISTRY[model._meta][2]
+
+    @classmethod
+    def build_pending(cls):
+        '''
+        Build every lazy history model that hasn't been built yet.
+        '''
+        with _build_lock:
+            for records, model in list(cls.PENDING.values()):
+                if model._meta in cls.PENDING:
+                    records.build_history_model(model)
 
     def monkey_patch_history_properties(self, cls):
         '''
@@ -168,6 +254,10 @@ class HistoricalRecords(object):
             opts.init_name_map = new_init_name_map
 
     def update_item_name_map(self, map, meta):
+        pending = HistoricalRecords.PENDING.get(meta)
+        if pending:
+            records, model = pending
+            records.get_history_model(model)
         if meta not in HistoricalRecords.REGISTRY:
             return map
 
@@ -255,10 +345,12 @@ class HistoricalRecords(object):
         rel_nm_user = '_%s_history_editor' % model._meta.object_name.lower()
         important_field_names = self.get_important_field_names(model)
 
-        def get_verbose_name(model, field_name):
-            for f in model._meta.fields:
-                if f.name == field_name:
-                    return f.verbose_name
+        differ = HistoryDiffer(self.get_important_fields(model),
+                               json_aware=True)
+        # Decides whether a save creates a new version.
+        version_differ = HistoryDiffer([
+            f for f in self.get_important_fields(model)
+            if f.name not in self.ignore_changes])
 
         class HistoryEntryMeta(ModelBase):
             """
@@ -266,6 +358,12 @@ class HistoricalRecords(object):
             and copy the necessary fields from the other model.
             """
             def __new__(c, name, bases, attrs):
+                if any(isinstance(base, c) for base in bases):
+                    # A subclass of the history model, e.g. the class Django
+                    # builds for records with deferred fields: keep its name,
+                    # or ModelBase would return the history model itself.
+                    return ModelBase.__new__(c, name, bases, attrs)
+
                 # Rename class
                 name = 'Historical%s' % model._meta.object_name
 
@@ -273,7 +371,12 @@ class HistoricalRecords(object):
                 attrs['__module__'] = self._module or model.__module__
 
                 # Copy attributes from base class
-                attrs.update(self.copy_fields(model))
+                fields = self.copy_fields(model)
+                if self.snapshot:
+                    pk_name = model._meta.pk.name
+                    fields = {pk_name: fields[pk_name],
+                              'history_snapshot': models.TextField()}
+                attrs.update(fields)
 
                 return ModelBase.__new__(c, name, bases, attrs)
 
@@ -286,6 +389,7 @@ class HistoricalRecords(object):
             class Meta:
                 ordering = ['-history_id']
                 get_latest_by = 'history_id'
+                index_together = [('history_editor', 'history_date')]
 
             history_id = models.AutoField(primary_key=True)
             history_date = models.DateTimeField(auto_now_add=True,
@@ -300,35 +404,147 @@ class HistoricalRecords(object):
 
             @property
             def previous_entry(self):
-                try:
-                    return self.history_object.history.order_by('-history_id').filter(history_id__lt=self.history_id)[0]
-                except IndexError:
-                    return None
+                records = self.historical_records
+                manager = getattr(model, records.manager_name)
+                return records.backend.previous(
+                    manager, getattr(self, model._meta.pk.attname),
+                    self.history_id)
 
             @property
             def modified_fields(self):
                 """
                 Return a list of which field have been changed during this save.
                 """
-                previous_entry = self.previous_entry
-                if previous_entry:
-                    modified = []
-                    for field in important_field_names:
-                        from_value = getattr(previous_entry, field)
-                        to_value = getattr(self, field)
-                        if from_value != to_value:
-                            modified.append(HistoryChange(field, from_value, to_value, get_verbose_name(model, field)))
-                    return modified
-                else:
-                    # No previous history entry, so actually everything has been modified.
-                    return [HistoryChange(f, None, getattr(self, f), get_verbose_name(model, f)) for f in important_field_names]
+                load_deferred_fields(self)
+                return differ.changes(self.previous_entry, self)
+
+            def related_ids(self, field_name):
+                """
+                Return the members of a tracked ManyToManyField as of the
+                date of this version.
+                """
+                manager = getattr(model, self.historical_records.manager_name)
+                return manager.m2m_as_of(field_name, self.history_date,
+                                         pk=getattr(self, model._meta.pk.attname))
 
         # create the descriptor for 'history_object' with the new HistoryEntry
         HistoryEntry.history_object = HistoricalObjectDescriptor(HistoryEntry)
         HistoryEntry.important_field_names = important_field_names
+        HistoryEntry.stored_field_names = important_field_names
+        if self.snapshot:
+            pk_name = model._meta.pk.attname
+            HistoryEntry.stored_field_names = [pk_name, 'history_snapshot']
+            HistoryEntry.snapshot_fields = dict(
+                (f.attname, f) for f in self.get_important_fields(model)
+                if f.attname != pk_name)
+            for name in HistoryEntry.snapshot_fields:
+                setattr(HistoryEntry, name, SnapshotFieldDescriptor(name))
+        HistoryEntry.differ = differ
+        HistoryEntry.version_differ = version_differ
+        HistoryEntry.historical_records = self
+        HistoryEntry.m2m_history_models = self.create_m2m_history_models(model)
 
         return HistoryEntry
 
+    def create_m2m_history_models(self, model):
+        """
+        Creates a model recording the members added to and removed from each
+        tracked ManyToManyField, returning a {field_name: model} dict.
+        """
+        m2m_models = {}
+        for field_name in self.m2m_fields:
+            field = model._meta.get_field(field_name)
+            name = 'Historical%s%s' % (
+                model._meta.object_name,
+                ''.join(part.capitalize() for part in field_name.split('_')))
+
+            class Meta:
+                ordering = ['-history_id']
+                index_together = [('object_id', 'history_id')]
+
+            m2m_models[field_name] = type(name, (models.Model,), {
+                '__module__': self._module or model.__module__,
+                'Meta': Meta,
+                'history_id': models.AutoField(primary_key=True),
+                'history_date': models.DateTimeField(auto_now_add=True),
+                'history_type': models.CharField(max_length=1,
+                                                 choices=M2M_HISTORY_TYPES),
+                'history_editor': models.ForeignKey(User, null=True,
+                                                    blank=True,
+                                                    related_name='+'),
+                'object_id': self.copy_key_field(model._meta.pk),
+                'related_id': self.copy_key_field(field.rel.to._meta.pk),
+            })
+        return m2m_models
+
+    def copy_key_field(self, field):
+        """
+        Return a plain, non-unique copy of a primary key field.
+        """
+        field = copy.copy(field)
+        if isinstance(field, models.AutoField):
+            field.__class__ = models.IntegerField
+        field.name = field.db_column = field.verbose_name = None
+        field.primary_key = False
+        field._unique = False
+        field.db_index = False
+        return field
+
+    def connect_m2m_changed(self, model, field_name):
+        """
+        Record the changes made to a tracked ManyToManyField, from either
+        side of the relation.
+        """
+        field = model._meta.get_field(field_name)
+        manager_name = self.manager_name
+
+        def m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+            if sender is not field.rel.through:
+                return
+            through = sender._default_manager
+            if reverse:
+                own_name = field.m2m_reverse_field_name()
+                other_name = field.m2m_field_name()
+            else:
+                own_name = field.m2m_field_name()
+                other_name = field.m2m_reverse_field_name()
+
+            if action == 'pre_clear':
+                # the cleared members are gone by the time post_clear is sent
+                instance._history_m2m_cleared = list(
+                    through.filter(**{own_name: instance.pk})
+                    .values_list(other_name, flat=True))
+                return
+            if action == 'post_clear':
+                pk_set = instance.__dict__.pop('_history_m2m_cleared', None)
+                history_type = M2M_REMOVED
+            elif action == 'post_add':
+                history_type = M2M_ADDED
+            elif action == 'post_remove':
+                history_type = M2M_REMOVED
+            else:
+                return
+            if not pk_set:
+                return
+
+            history_model = getattr(model, manager_name).model\
+                .m2m_history_models[field_name]
+            editor = getattr(instance, '_history_editor', None)
+            if reverse:
+                pairs = [(pk, instance.pk) for pk in pk_set]
+            else:
+                pairs = [(instance.pk, pk) for pk in pk_set]
+            history_model._default_manager.bulk_create([
+                history_model(history_type=history_type,
+                              history_editor=editor,
+                              object_id=object_id,
+                              related_id=related_id)
+                for object_id, related_id in pairs])
+
+        # The HistoricalRecords object will be discarded, and the through
+        # model may not have been resolved yet; filter by sender instead.
+        models.signals.m2m_changed.connect(m2m_changed, weak=False)
+
     def get_field_dependencies(self, model):
         deps = []
         for field in model._meta.fields:
@@ -338,14 +554,19 @@ class HistoricalRecords(object):
                     pass
                 else:
                     deps.append(field)
+        for field in model._meta.many_to_many:
+            if field.name in self.m2m_fields:
+                deps.append(field)
         return deps
 
     def get_important_fields(self, model):
         """ Return the list of fields that we care about.  """
-        for f in model._meta.fields:
-            #import pdb; pdb.set_trace();
-            if f == model._meta.pk or not self._fields or f.name in self._fields:
-                yield f
+        meta = model._meta
+        if meta not in self._field_plans:
+            self._field_plans[meta] = [
+                f for f in meta.fields
+                if f == meta.pk or not self._fields or f.name in self._fields]
+        return self._field_plans[meta]
 
     def get_important_field_names(self, model):
         """ Return the names of the fields that we care about.  """
@@ -423,21 +644,35 @@ class HistoricalRecords(object):
         # (for example from a fixture) and we don't want to execute this hook.
         if 'raw' in kwargs and kwargs['raw']:
             return
+        if self.ignores_update(instance, kwargs.get('update_fields')):
+            return
+        collapse = HistoryBatch.collapsing()
+        if collapse is not None and isinstance(self.backend, ModelBackend):
+            collapse.add_version(self, instance, created)
+            return
         # Decide whether to save a history copy: only when certain fields were changed.
-        save = True
-        try:
-            most_recent = getattr(instance, self.manager_name).most_recent()
-            save = False
-            for field in self.get_important_field_names(instance):
-                if getattr(instance, field) != getattr(most_recent, field):
-                    save = True
-        except instance.DoesNotExist:
-            pass
+        manager = getattr(instance, self.manager_name)
+        latest = manager.latest_version()
+        save = latest is None or \
+            manager.model.version_differ.differs(latest, instance)
 
         # Create historical record
         if save:
             self.create_historical_record(instance, instance._history_editor, created and CREATED or MODIFIED)
 
+    def ignores_update(self, instance, update_fields):
+        '''
+        Return True if a save(update_fields=...) only touched fields listed in
+        ignore_changes, so it can't create a new version.
+        '''
+        if not update_fields or not self.ignore_changes:
+            return False
+        ignored = set()
+        for field in instance._meta.fields:
+            if field.name in self.ignore_changes:
+                ignored.update([field.name, field.attname])
+        return ignored.issuperset(update_fields)
+
     def post_delete(self, instance, **kwargs):
         try:
             self.create_historical_record(instance, instance._history_editor, DELETED)
@@ -445,31 +680,88 @@ class HistoricalRecords(object):
             pass
 
     def create_historical_record(self, instance, editor, type):
-        manager = getattr(instance, self.manager_name)
+        record = self.build_historical_record(instance, editor, type)
+        batch = HistoryBatch.current()
+        if batch is not None and (batch.deleting or not preserves_keys(self)):
+            batch.add(record)
+        else:
+            self.write_record(record)
+        collapse = HistoryBatch.collapsing()
+        if collapse is not None:
+            collapse.record_added(record)
+
+    def write_record(self, record):
+        self.backend.write(record.__class__, [record])
+        self.record_written(record)
+
+    def record_written(self, record):
+        '''
+        Invalidate cached lookups for the object a new record belongs to.
+        '''
+        if self.cache is not None:
+            pk_name = record.primary_model._meta.pk.attname
+            self.cache.invalidate(getattr(record, pk_name))
+
+    def build_historical_record(self, instance, editor, type):
+        """
+        Return an unsaved historical record for the current state of instance.
+        """
+        history_model = getattr(instance.__class__, self.manager_name).model
         attrs = {}
         for field in self.get_important_fields(instance):
+            if self.snapshot and field != instance._meta.pk:
+                # no foreign key constraints to break in the snapshot
+                attrs[field.attname] = getattr(instance, field.attname)
+                continue
+
             '''
             Detect a condition where a cascading delete causes an integrity
             error because the post_delete trigger tries to create a
             reference to a now-deleted instance in its history record.  This
             should only be an issue on PRESERVEd foreign keys, since CONVERTed
-            ones won't have an explicit reference.
+            ones won't have an explicit reference, and only when recording a
+            deletion: a saved instance references existing objects.
 
             Raise a specific exception when the condition is detected, allowing
             post_delete to ignore historical record creation in this case.
             '''
-            if isinstance(field, models.ForeignKey):
+            if type == DELETED and isinstance(field, models.ForeignKey):
                 conversion = self.key_conversions.get(field.name, CONVERT)
-                if conversion == PRESERVE:
-                    try:
-                        # dereference key to make sure it exists
-                        getattr(instance, field.name)
-                    except field.rel.to.DoesNotExist as e:
-                        raise HistoricalIntegrityError(e)
+                if conversion == PRESERVE and \
+                        not self.related_exists(instance, field):
+                    raise HistoricalIntegrityError(
+                        '%s matching query does not exist.' %
+                        field.rel.to._meta.object_name)
 
             # copy field values normally
             attrs[field.attname] = getattr(instance, field.attname)
-        manager.create(history_type=type, history_editor=editor, **attrs)
+        if self.snapshot:
+            pk_name = instance._meta.pk.attname
+            attrs = {pk_name: attrs.pop(pk_name),
+                     'history_snapshot': encode_snapshot(attrs)}
+        return history_model(history_type=type, history_editor=editor, **attrs)
+
+    def related_exists(self, instance, field):
+        '''
+        Check whether the object referenced by a foreign key still exists,
+        without loading it. Within a deletion, the answer is remembered, so
+        that deleting many children of one parent checks the parent only
+        once. (Deletions run their post_delete signals after every row is
+        gone, so the answer doesn't change during one; the memo is reset
+        for each deletion, see monkey_patch_collector().)
+        '''
+        value = getattr(instance, field.attname)
+        if value is None:
+            return True
+        batch = HistoryBatch.current()
+        key = (field.rel.to, value)
+        if batch is not None and key in batch.related:
+            return batch.related[key]
+        exists = field.rel.to._base_manager\
+            .filter(**{field.rel.field_name: value}).exists()
+        if batch is not None:
+            batch.related[key] = exists
+        return exists
 
 
 class HistoricalObjectDescriptor(object):
@@ -477,10 +769,327 @@ class HistoricalObjectDescriptor(object):
         self.history_model = history_model
 
     def __get__(self, instance, owner):
+        load_deferred_fields(instance)
         values = dict((f, getattr(instance, f)) for f in
                        self.history_model.important_field_names)
         return self.history_model.primary_model(**values)
 
 
+def encode_snapshot(values):
+    '''
+    Serialize a {attname: value} dict into the compressed text stored in the
+    history_snapshot column.
+    '''
+    data = json.dumps(values, default=encode_value, separators=(',', ':'))
+    return base64.b64encode(zlib.compress(data.encode('utf-8')))\
+        .decode('ascii')
+
+
+def decode_snapshot(history_model, text):
+    '''
+    Return the {attname: value} dict serialized in a history_snapshot.
+    '''
+    if not text:
+        return {}
+    data = json.loads(zlib.decompress(base64.b64decode(text)).decode('utf-8'))
+    fields = history_model.snapshot_fields
+    return dict((str(name), fields[name].to_python(value))
+                for name, value in data.items() if name in fields)
+
+
+class SnapshotFieldDescriptor(object):
+    '''
+    Give access to a field stored in the history_snapshot column of a
+    snapshot history model. The snapshot is decoded on first access.
+    '''
+    def __init__(self, name):
+        self.name = name
+
+    def values(self, instance):
+        values = instance.__dict__.get('_snapshot_values')
+        if values is None:
+            load_deferred_fields(instance)
+            values = decode_snapshot(instance.__class__,
+                                     instance.history_snapshot)
+            instance.__dict__['_snapshot_values'] = values
+        return values
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.values(instance).get(self.name)
+
+    def __set__(self, instance, value):
+        self.values(instance)[self.name] = value
+
+
+def load_deferred_fields(record, batch_size=500):
+    '''
+    Load the deferred field values of a historical record, e.g. one listed by
+    HistoryManager.metadata_only(). The other records listed along with it
+    are loaded by the same query, instead of one query per field and record.
+    '''
+    if not getattr(record, '_deferred', False):
+        return
+    group = getattr(record, '_deferred_group', None) or [record]
+    pending = [r for r in group
+               if any(name not in r.__dict__ for name in r.stored_field_names)]
+    if not pending:
+        return
+
+    history_model = record.__class__._meta.concrete_model
+    names_by_attname = dict((f.attname, f.name)
+                            for f in history_model._meta.fields)
+    attnames = [name for name in history_model.stored_field_names
+                if any(name not in r.__dict__ for r in pending)]
+    value_names = [names_by_attname[name] for name in attnames]
+
+    by_id = dict((r.history_id, r) for r in pending)
+    ids = list(by_id.keys())
+    for start in range(0, len(ids), batch_size):
+        rows = history_model._base_manager\
+            .filter(history_id__in=ids[start:start + batch_size])\
+            .values_list('history_id', *value_names)
+        for row in rows:
+            target = by_id[row[0]]
+            for attname, value in zip(attnames, row[1:]):
+                target.__dict__.setdefault(attname, value)
+
+
 class HistoricalIntegrityError(django.db.IntegrityError):
     pass
+
+
+_batch_state = threading.local()
+
+
+class HistoryBatch(object):
+    """
+    Collect the historical records created while the batch is active and save
+    them with one bulk insert per history model when the outermost batch
+    exits. Nested batches join the outermost one.
+
+      >>> with HistoryBatch():
+      ...     for obj in objs:
+      ...         obj.delete()
+
+    With collapse=True, saving the same object several times within the
+    batch produces a single version holding its final state, typed CREATED
+    if the object was created within the batch:
+
+      >>> with transaction.commit_on_success():
+      ...     with HistoryBatch(collapse=True):
+      ...         obj = Obj.objects.create()
+      ...         obj.slug = slugify(obj.pk)
+      ...         obj.save()
+
+    A collapsing batch doesn't hold records back: the first save of an
+    object writes its version right away and later saves update that
+    version in place, so the versions are part of the transaction of the
+    saves and visible to most_recent() and as_of() at once. Deletions and
+    the other records written meanwhile aren't collapsed. Models whose
+    history backend can't update records (see history.backends) get a
+    version per save.
+    """
+
+    def __init__(self, collapse=False):
+        self.records = []
+        # (model, key) -> whether the object exists, see related_exists()
+        self.related = {}
+        # records keeping foreign keys, see monkey_patch_collector()
+        self.preserved = []
+        self.deleting = False
+        self.collapse = collapse
+        # (history_model, pk) -> [written record or None, baseline]
+        self.pending = {}
+        self.outer = None
+
+    @classmethod
+    def current(cls):
+        """
+        Return the active batch collecting records, if any.
+        """
+        return getattr(_batch_state, 'batch', None)
+
+    @classmethod
+    def collapsing(cls):
+        """
+        Return the active collapsing batch, if any.
+        """
+        return getattr(_batch_state, 'collapse', None)
+
+    def __enter__(self):
+        attr = 'collapse' if self.collapse else 'batch'
+        self.outer = getattr(_batch_state, attr, None)
+        if self.outer is None:
+            setattr(_batch_state, attr, self)
+            return self
+        return self.outer
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer is None:
+            if self.collapse:
+                _batch_state.collapse = None
+                self.pending = {}
+            else:
+                _batch_state.batch = None
+                if exc_type is None:
+                    self.flush()
+
+    def add(self, record):
+        if preserves_keys(record.__class__.historical_records):
+            self.preserved.append(record)
+        else:
+            self.records.append(record)
+
+    def record_added(self, record):
+        """
+        Forget the version collapsed for the object of record, which isn't
+        its latest one any more: later saves start a new version.
+        """
+        pk_name = record.primary_model._meta.pk.attname
+        self.pending.pop((record.__class__, getattr(record, pk_name)), None)
+
+    def add_version(self, records, instance, created):
+        """
+        Record a save of instance, updating the version written for it in
+        this batch if there is one.
+        """
+        manager = getattr(instance, records.manager_name)
+        history_model = manager.model
+        key = (history_model, instance.pk)
+        if key not in self.pending:
+            # Compare against the stored history only once per object.
+            baseline = None
+            if not created:
+                baseline = manager.latest_version()
+            self.pending[key] = [None, baseline]
+        written, baseline = self.pending[key]
+
+        if baseline is not None and \
+                not history_model.version_differ.differs(baseline, instance):
+            # Back to the state before the batch: drop our version.
+            if written is not None:
+                written.delete()
+                self.pending[key][0] = None
+                records.record_written(written)
+            return
+
+        history_type = baseline is None and CREATED or MODIFIED
+        record = records.build_historical_record(
+            instance, instance._history_editor, history_type)
+        if written is None:
+            records.write_record(record)
+            self.pending[key] = [record, baseline]
+            return
+        record.history_id = written.history_id
+        record.history_date = timezone.now()
+        if not self.update_record(record):
+            # The transaction that wrote our version was rolled back: start
+            # over against the stored history.
+            del self.pending[key]
+            return self.add_version(records, instance, created)
+        self.pending[key][0] = record
+        records.record_written(record)
+
+    def update_record(self, record):
+        """
+        Update the stored row of record, returning False if there is none.
+        """
+        values = dict((f.name, getattr(record, f.attname))
+                      for f in record._meta.local_fields if not f.primary_key)
+        return record.__class__._base_manager\
+            .filter(history_id=record.history_id).update(**values) > 0
+
+    def flush(self, preserved_only=False):
+        """
+        Write the collected records, or only those keeping foreign keys.
+        """
+        records = self.preserved
+        self.preserved = []
+        if not preserved_only:
+            records += self.records
+            self.records = []
+        by_model = {}
+        order = []
+        for record in records:
+            if record.__class__ not in by_model:
+                by_model[record.__class__] = []
+                order.append(record.__class__)
+            by_model[record.__class__].append(record)
+        for history_model in order:
+            records = history_model.historical_records
+            records.backend.write(history_model, by_model[history_model])
+            for record in by_model[history_model]:
+                records.record_written(record)
+
+
+try:
+    from django.db.models.deletion import force_managed
+except ImportError:
+    force_managed = lambda func: func
+
+
+def monkey_patch_collector():
+    '''
+    Run every deletion, including cascades and queryset deletes, inside a
+    HistoryBatch, so that the DELETED records of all collected instances are
+    written with one bulk insert per history model instead of one insert per
+    post_delete signal. The batch is flushed in the deletion's transaction.
+
+    Records keeping foreign keys (PRESERVE) are only held back while a
+    deletion runs, and are written when it ends: a later deletion in an
+    enclosing batch then finds and removes them along with the objects they
+    reference, as it would without the batch.
+    '''
+    original_delete = Collector.delete
+    if getattr(original_delete, 'batches_history', False):
+        return
+
+    @force_managed
+    def delete(collector):
+        with HistoryBatch() as batch:
+            # which related objects exist changes with every deletion
+            batch.related = {}
+            deleting, batch.deleting = batch.deleting, True
+            try:
+                original_delete(collector)
+            finally:
+                batch.deleting = deleting
+            if not deleting:
+                batch.flush(preserved_only=True)
+
+    delete = wraps(original_delete)(delete)
+    delete.batches_history = True
+    Collector.delete = delete
+
+
+def preserves_keys(records):
+    '''
+    Return True if the history models of records keep foreign keys to the
+    objects their primary model references.
+    '''
+    return not records.snapshot and PRESERVE in records.key_conversions.values()
+
+
+_build_lock = threading.RLock()
+
+
+def monkey_patch_app_cache():
+    '''
+    Make the app cache build any pending lazy history models once it has
+    loaded every app, so that syncdb, validation, get_models(), etc. still
+    see every history model.
+    '''
+    original_populate = AppCache._populate
+    if getattr(original_populate, 'builds_history_models', False):
+        return
+
+    @wraps(original_populate)
+    def populate(*args, **kwargs):
+        original_populate(*args, **kwargs)
+        if HistoricalRecords.PENDING:
+            HistoricalRecords.build_pending()
+
+    populate.builds_history_models = True
+    AppCache._populate = populate
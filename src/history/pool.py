@@ -0,0 +1,59 @@
+"""
+A bounded pool of worker threads for running history lookups concurrently,
+e.g. from asyncio code:
+
+    >>> futures = [obj.history.amost_recent() for obj in objs]
+    >>> versions = yield from asyncio.gather(
+    ...     *[asyncio.wrap_future(f) for f in futures])
+
+Each worker thread keeps its own database connections and reuses them from
+one lookup to the next. The pool size is read from the
+HISTORY_THREAD_POOL_SIZE setting (4 by default).
+
+Requires concurrent.futures, which is part of the standard library on
+Python 3 and available as the 'futures' package on Python 2.
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if ThreadPoolExecutor is None:
+            raise ImproperlyConfigured("Concurrent history lookups require "
+                                       "the 'futures' package on Python 2.")
+        with _executor_lock:
+            if _executor is None:
+                size = getattr(settings, 'HISTORY_THREAD_POOL_SIZE', 4)
+                _executor = ThreadPoolExecutor(max_workers=size)
+    return _executor
+
+
+def run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # End the implicit transaction of the lookup, so that the connection
+        # doesn't keep an old snapshot open until the next one.
+        for connection in connections.all():
+            transaction.rollback_unless_managed(using=connection.alias)
+
+
+def submit(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on the history worker pool and return a
+    concurrent.futures.Future for its result.
+    """
+    return get_executor().submit(run, func, args, kwargs)
@@ -0,0 +1,130 @@
+"""
+Retention policies for historical records.
+
+    class MyModel(models.Model):
+        ...
+        history = HistoricalRecords(retention=[
+            KeepLast(50),
+            Downsample('day', after=datetime.timedelta(days=30)),
+        ])
+
+Policies are enforced by the prune_history management command. A version
+is dropped if any policy selects it, except that the most recent version
+of every object is always kept, so most_recent() and get_or_restore() keep
+working after an object has been deleted.
+"""
+import datetime
+
+from django.utils import timezone
+
+
+class KeepLast(object):
+    """
+    Keep only the count most recent versions of each object.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+    def prunable(self, versions, now):
+        return [version[0] for version in versions[self.count:]]
+
+
+class MaxAge(object):
+    """
+    Drop versions older than age (a timedelta).
+    """
+
+    def __init__(self, age):
+        self.age = age
+
+    def prunable(self, versions, now):
+        cutoff = now - self.age
+        return [version[0] for version in versions if version[1] < cutoff]
+
+
+class Downsample(object):
+    """
+    Keep only the most recent version per hour or per day for versions that
+    are older than after (a timedelta). Aware dates are bucketed in the
+    default time zone.
+    """
+    PERIODS = {
+        'hour': dict(minute=0, second=0, microsecond=0),
+        'day': dict(hour=0, minute=0, second=0, microsecond=0),
+    }
+
+    def __init__(self, period, after=datetime.timedelta(0)):
+        if period not in self.PERIODS:
+            raise ValueError('Invalid downsampling period: %r' % (period,))
+        self.period = period
+        self.after = after
+
+    def prunable(self, versions, now):
+        cutoff = now - self.after
+        truncate = self.PERIODS[self.period]
+        seen = set()
+        prunable = []
+        for history_id, history_date, history_type in versions:
+            if history_date >= cutoff:
+                continue
+            if timezone.is_aware(history_date):
+                history_date = timezone.make_naive(
+                    history_date, timezone.get_default_timezone())
+            bucket = history_date.replace(**truncate)
+            if bucket in seen:
+                prunable.append(history_id)
+            else:
+                seen.add(bucket)
+        return prunable
+
+
+def prune(history_model, policies, now=None, chunk_size=900,
+          batch_size=500):
+    """
+    Delete the versions of history_model selected by policies, walking the
+    primary keys in chunks of chunk_size and deleting at most batch_size
+    rows per statement. Each chunk is queried with an IN clause; the
+    default chunk_size stays below the 999 parameters SQLite allows.
+    Returns the number of deleted versions.
+    """
+    now = now or timezone.now()
+    pk_name = history_model.primary_model._meta.pk.name
+    records = history_model.historical_records
+    manager = history_model._default_manager
+    deleted = 0
+    last_pk = None
+
+    while True:
+        pks = manager.order_by(pk_name).values_list(pk_name, flat=True)
+        if last_pk is not None:
+            pks = pks.filter(**{'%s__gt' % pk_name: last_pk})
+        pks = list(pks.distinct()[:chunk_size])
+        if not pks:
+            return deleted
+        last_pk = pks[-1]
+
+        # versions of each object, newest first, without loading any of the
+        # copied field values
+        versions = {}
+        rows = manager.filter(**{'%s__in' % pk_name: pks})\
+            .order_by(pk_name, '-history_id')\
+            .values_list(pk_name, 'history_id', 'history_date', 'history_type')
+        for row in rows:
+            versions.setdefault(row[0], []).append(row[1:])
+
+        doomed = []
+        for pk, object_versions in versions.items():
+            prunable = set()
+            for policy in policies:
+                prunable.update(policy.prunable(object_versions, now))
+            prunable.discard(object_versions[0][0])
+            if prunable:
+                doomed.extend(prunable)
+                if records.cache is not None:
+                    records.cache.invalidate(pk)
+
+        for start in range(0, len(doomed), batch_size):
+            manager.filter(history_id__in=doomed[start:start + batch_size])\
+                .delete()
+        deleted += len(doomed)
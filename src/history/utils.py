@@ -1,3 +1,4 @@
+from history.backends import uses_table
 from history.models import HistoricalRecords
 
 
@@ -20,3 +21,34 @@ def monkeypatch_history_for_model(model, attribute_name, module):
     history.contribute_to_class(model, attribute_name)
     history.finalize(model)
 
+
+def get_registered_models(labels=None):
+    """
+    Return the (model, manager_name, history_model) registry entries for the
+    given 'app_label.ModelName' labels, or for every model with history if
+    no labels are given. Models whose history isn't stored in their history
+    table are left out, or rejected if they are named.
+    """
+    from django.core.management.base import CommandError
+    from django.db.models import get_model
+
+    HistoricalRecords.build_pending()
+    if not labels:
+        return sorted([entry for entry in HistoricalRecords.REGISTRY.values()
+                       if uses_table(entry[2])],
+                      key=lambda entry: entry[0]._meta.db_table)
+
+    entries = []
+    for label in labels:
+        try:
+            app_label, model_name = label.split('.')
+        except ValueError:
+            raise CommandError('Expected app_label.ModelName, got %r' % label)
+        model = get_model(app_label, model_name)
+        if model is None or model._meta not in HistoricalRecords.REGISTRY:
+            raise CommandError('%s has no historical records.' % label)
+        if not uses_table(HistoricalRecords.REGISTRY[model._meta][2]):
+            raise CommandError("%s doesn't store its history in its history "
+                               "table." % label)
+        entries.append(HistoricalRecords.REGISTRY[model._meta])
+    return entries
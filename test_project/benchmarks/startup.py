@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Measure how long it takes to declare a large number of tracked models, with
+eager and with lazy history model construction.
+
+    $ cd test_project && python -m benchmarks.startup 500
+"""
+import sys
+import time
+
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                           'NAME': ':memory:'}},
+    INSTALLED_APPS=('django.contrib.contenttypes', 'django.contrib.auth'),
+)
+
+from django.db import models
+from history.models import HistoricalRecords
+
+
+class Meta:
+    app_label = 'startup_benchmark'
+
+
+def declare_models(prefix, count, lazy):
+    start = time.time()
+    previous = None
+    for i in range(count):
+        attrs = {
+            '__module__': __name__,
+            'Meta': Meta,
+            'characters': models.CharField(max_length=255, blank=True),
+            'integer': models.IntegerField(default=-1),
+            'date': models.DateTimeField(auto_now=True),
+            'history': HistoricalRecords(lazy=lazy),
+        }
+        if previous is not None:
+            attrs['parent'] = models.ForeignKey(previous, null=True)
+        previous = type('%s%d' % (prefix, i), (models.Model,), attrs)
+    return time.time() - start
+
+
+def main(count):
+    eager = declare_models('Eager', count, lazy=False)
+    lazy = declare_models('Lazy', count, lazy=True)
+    print('%d models, eager: %.3fs' % (count, eager))
+    print('%d models, lazy:  %.3fs' % (count, lazy))
+
+    start = time.time()
+    HistoricalRecords.build_pending()
+    print('building the deferred history models: %.3fs' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -1,5 +1,7 @@
 from django.db import models
 from history.models import HistoricalRecords, CONVERT, PRESERVE
+from history.retention import KeepLast
+from history.backends import SQLiteLogBackend
 
 # stop Django auth's broken permission generation from thwarting our efforts here
 # (see wontfix'd ticket #4748 and the more recent #8162 which isn't dead yet)
@@ -25,6 +27,38 @@ class NonversionedModel(BaseModel):
 class VersionedModel(BaseModel):
     history = HistoricalRecords()
 
+class LazyVersionedModel(BaseModel):
+    '''
+    Test that history models built on first use behave like eager ones.
+    '''
+    history = HistoricalRecords(lazy=True)
+
+class CachedVersionedModel(BaseModel):
+    history = HistoricalRecords(cache=True)
+
+class RetainedVersionedModel(BaseModel):
+    history = HistoricalRecords(retention=KeepLast(3))
+
+class LoggedVersionedModel(BaseModel):
+    # LogBackendTest gives each test its own log file.
+    history = HistoricalRecords(backend=SQLiteLogBackend(':memory:'))
+
+class SnapshotVersionedModel(BaseModel):
+    history = HistoricalRecords(snapshot=True)
+
+class IgnoredChangesModel(BaseModel):
+    history = HistoricalRecords(ignore_changes=['boolean', 'characters'])
+
+class Tag(models.Model):
+    name = models.CharField(max_length=32)
+
+class TaggedModel(BaseModel):
+    '''
+    Test that membership changes of tracked ManyToManyFields are recorded.
+    '''
+    tags = models.ManyToManyField('Tag', related_name='tagged')
+    history = HistoricalRecords(m2m_fields=['tags'])
+
 class InheritedVersionedModel(VersionedModel):
     '''
     Test that history fields are correctly inherited.
@@ -71,6 +105,13 @@ class ConvertFkToVersionedModel(BaseModel):
     fk = models.ForeignKey('VersionedModel', related_name='rel_c')
     history = HistoricalRecords(key_conversions={'fk': CONVERT})
 
+class ChainedFkModel(BaseModel):
+    '''
+    Model two foreign keys away from VersionedModel, for object graph tests.
+    '''
+    fk = models.ForeignKey('ConvertFkToVersionedModel')
+    history = HistoricalRecords(key_conversions={'fk': CONVERT})
+
 class NullCascadingFkModel(BaseModel):
     '''
     Test that on_delete SET_NULL behavior works as expected.
@@ -5,12 +5,35 @@ unittest). These will both pass when you run "manage.py test".
 Replace these with more appropriate tests for your application.
 """
 import datetime
+import decimal
+import json
+import os
+import shutil
+import tempfile
+import time
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
 from django.db.models import Sum, Min, Max, Count
-from django.utils import unittest
+from django.db.models import TextField as DjangoTextField
+from django.utils import timezone, unittest
+from django.utils.six import StringIO
 from django.test import TransactionTestCase as TestCase
-from history.models import CREATED, MODIFIED, DELETED
+from history.models import CREATED, MODIFIED, DELETED, HistoricalRecords, \
+    HistoryBatch
+from history.middleware import CollapseHistoryMiddleware
+from history import pool
+from history import diff
+from history import feed
+from history.feed import ChangeFeed, timeline
+from history import retention
+from history.backends import SQLiteLogBackend
+from history.cache import DjangoCache
+from history.utils import get_registered_models
+from history.consistency import find_drift
 
 from test_app import models
 
@@ -28,6 +51,24 @@ def add_history(instance, prop, values):
         setattr(instance, prop, v)
         instance.save()
 
+class QueryLog(object):
+    '''
+    Context manager recording the SQL statements executed inside it.
+    '''
+    def __enter__(self):
+        self.old_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        self.start = len(connection.queries)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.queries = [q['sql'] for q in connection.queries[self.start:]]
+        connection.use_debug_cursor = self.old_debug_cursor
+
+    def count(self, prefix, table):
+        return len([sql for sql in self.queries
+                    if sql.startswith(prefix) and table in sql])
+
 class BasicHistoryTest(TestCase):
 
     def setUp(self):
@@ -61,6 +102,13 @@ class BasicHistoryTest(TestCase):
             .aggregate(x=Sum('%s__integer' % self.history_manager))['x']
         self.assertEqual(aggsum, sum(range(10)))
 
+    def test_as_of_date(self):
+        history = getattr(self.obj, self.history_manager)
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertEqual(history.as_of(tomorrow).integer, 9)
+        with self.assertRaises(self.model.DoesNotExist):
+            history.as_of(datetime.date(2000, 1, 1))
+
     def test_primary_model_access(self):
         '''
         Test that HistoryManager and HistoryRecords (and its instances) have 
@@ -253,6 +301,37 @@ class InstancePropertyTest(TestCase):
         self.assertEqual(self.obj.history.created_by, self.creator)
         self.assertEqual(self.obj.history.last_modified_by, final_editor)
 
+class EditorPrefetchTest(TestCase):
+    def test_editors_in_one_query(self):
+        users = [User.objects.create_user(u, '%s@example.com' % u, u)
+                 for u in ['erin', 'finn', 'gwen']]
+        m = models.VersionedModel()
+        for idx in range(9):
+            m.integer = idx
+            m.save(editor=users[idx % len(users)])
+
+        with self.assertNumQueries(1):
+            editors = [h.history_editor for h in m.history.with_editors()]
+        self.assertEqual(editors, [users[idx % len(users)]
+                                   for idx in reversed(range(9))])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(m.history.created_by, users[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(m.history.last_modified_by, users[2])
+
+        with self.assertNumQueries(1):
+            records, _ = m.history.page(limit=5)
+            self.assertEqual([r.history_editor for r in records],
+                             [users[idx % len(users)]
+                              for idx in reversed(range(4, 9))])
+
+    def test_plain_querysets(self):
+        m = create_history(models.VersionedModel, 'integer', range(3))
+        # no join by default, so callers can defer fields
+        dates = [r.history_date for r in m.history.only('history_date')]
+        self.assertEqual(len(dates), 3)
+
 @unittest.skip("Inherited classes aren't supported yet")
 class InheritedFkTest(BasicHistoryTest):
     def setUp(self):
@@ -270,6 +349,322 @@ class RenamedHistoryFieldTest(BasicHistoryTest):
         self.history_manager = 'othername'
         super(RenamedHistoryFieldTest, self).setUp()
 
+class LazyHistoryTest(BasicHistoryTest):
+    def setUp(self):
+        self.model = models.LazyVersionedModel
+        super(LazyHistoryTest, self).setUp()
+
+    def test_built_and_registered(self):
+        self.assertFalse(self.model._meta in HistoricalRecords.PENDING)
+        registered = HistoricalRecords.REGISTRY[self.model._meta]
+        self.assertEqual(registered[2], self.model.history.model)
+
+class CachedHistoryTest(BasicHistoryTest):
+    def setUp(self):
+        self.model = models.CachedVersionedModel
+        super(CachedHistoryTest, self).setUp()
+
+    def test_cached_lookups(self):
+        m = create_history(self.model, 'integer', range(3))
+        hour_ago = datetime.datetime.now() - datetime.timedelta(hours=1)
+        m.history.update(history_date=hour_ago)
+        date = hour_ago + datetime.timedelta(seconds=1)
+        self.assertEqual(m.history.as_of(date).integer, 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(m.history.as_of(date).integer, 2)
+
+        # lookups of the present aren't cached
+        m.integer = 3
+        m.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(m.history.most_recent().integer, 3)
+        with self.assertNumQueries(1):
+            now = datetime.datetime.now()
+            self.assertEqual(m.history.as_of(now).integer, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(m.history.as_of(now).integer, 3)
+        self.assertEqual(m.history.as_of(date).integer, 2)
+        m_pk = m.pk
+        m.delete()
+        with self.assertRaises(self.model.DoesNotExist):
+            self.model.history.as_of(datetime.datetime.now(), pk=m_pk)
+
+    def test_rolled_back_version(self):
+        m = self.model.objects.create(integer=1)
+        try:
+            with transaction.commit_on_success():
+                m.integer = 2
+                m.save()
+                self.assertEqual(m.history.most_recent().integer, 2)
+                self.assertEqual(
+                    m.history.as_of(datetime.datetime.now()).integer, 2)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(m.history.most_recent().integer, 1)
+
+        # the same change made again is recorded
+        m = self.model.objects.get(pk=m.pk)
+        m.integer = 2
+        m.save()
+        self.assertEqual(m.history.count(), 2)
+        self.assertEqual(m.history.most_recent().integer, 2)
+
+class DjangoCacheTest(TestCase):
+    def test_invalidate(self):
+        cache = DjangoCache('test-history')
+        key = ('as_of', '2000-01-01')
+        cache.set(1, key, 'one')
+        cache.set(2, key, 'two')
+        self.assertEqual(cache.get(1, key), 'one')
+
+        cache.invalidate(1)
+        self.assertEqual(cache.get(1, key), None)
+        self.assertEqual(cache.get(2, key), 'two')
+        cache.set(1, key, 'one again')
+        self.assertEqual(cache.get(1, key), 'one again')
+
+        # a generation that expired starts over later than any earlier one
+        time.sleep(0.01)
+        cache.backend.delete(cache.generation_key(2))
+        self.assertEqual(cache.get(2, key), None)
+        # invalidating a pk without a generation starts one too
+        cache.invalidate(3)
+        self.assertEqual(cache.get(3, key), None)
+        cache.set(3, key, 'three')
+        self.assertEqual(cache.get(3, key), 'three')
+
+class LogBackendTest(TestCase):
+    def setUp(self):
+        self.model = models.LoggedVersionedModel
+        self.records = self.model.history.model.historical_records
+        self.directory = tempfile.mkdtemp()
+        self.original_backend = self.records.backend
+        self.records.backend = SQLiteLogBackend(
+            os.path.join(self.directory, 'history.db'))
+
+    def tearDown(self):
+        self.records.backend.connection().close()
+        self.records.backend = self.original_backend
+        shutil.rmtree(self.directory)
+
+    def test_lookups(self):
+        before = datetime.datetime.now()
+        m = create_history(self.model, 'integer', range(3), characters='log')
+        self.assertEqual(m.history.most_recent().integer, 2)
+        self.assertEqual(m.history.most_recent().characters, 'log')
+        versions = list(m.history.versions())
+        self.assertEqual([v.integer for v in versions], [2, 1, 0])
+        self.assertEqual([v.history_type for v in versions],
+                         [MODIFIED, MODIFIED, CREATED])
+        self.assertEqual(m.history.as_of(datetime.datetime.now()).integer, 2)
+        with self.assertRaises(self.model.DoesNotExist):
+            m.history.as_of(before)
+
+        # records go to the log, not to the history table
+        self.assertEqual(m.history.count(), 0)
+
+    def test_unchanged_save(self):
+        m = create_history(self.model, 'integer', range(2))
+        m.save()
+        self.assertEqual(len(list(m.history.versions())), 2)
+
+    def test_modified_fields(self):
+        m = create_history(self.model, 'integer', range(2))
+        latest, first = list(m.history.versions())
+        self.assertEqual(latest.previous_entry.history_id, first.history_id)
+        self.assertEqual(first.previous_entry, None)
+        self.assertEqual([c.name for c in latest.modified_fields],
+                         ['integer'])
+
+    def test_created_and_modified(self):
+        user = User.objects.create_user('logger', 'logger@example.com', '?')
+        m = self.model.objects.create(integer=0, editor=user)
+        m.integer = 1
+        m.save()
+        latest, first = list(m.history.versions())
+        self.assertEqual(m.history.created_date, first.history_date)
+        self.assertEqual(m.history.created_by, user)
+        self.assertEqual(m.history.last_modified_date, latest.history_date)
+        self.assertEqual(m.history.last_modified_by, latest.history_editor)
+
+    def test_table_readers(self):
+        m = create_history(self.model, 'integer', range(2))
+        with self.assertRaises(ImproperlyConfigured):
+            m.history.page()
+        with self.assertRaises(ImproperlyConfigured):
+            m.history.field_timeline('integer')
+        with self.assertRaises(ImproperlyConfigured):
+            self.model.history.restore_to(datetime.datetime.now(), [m.pk])
+        self.assertNotIn(self.model.history.model, feed.get_history_models())
+
+        # management commands skip the model, or refuse it by name
+        call_command('backfill_history', verbosity=0)
+        call_command('check_history', repair=True, verbosity=0)
+        self.assertEqual(len(list(m.history.versions())), 2)
+        with self.assertRaises(CommandError):
+            get_registered_models(['test_app.LoggedVersionedModel'])
+
+    def test_batch(self):
+        objs = [self.model.objects.create(integer=i) for i in range(3)]
+        m_pk = objs[0].pk
+        self.model.objects.all().delete()
+        version = self.model.history.as_of(datetime.datetime.now(), pk=m_pk,
+                                           restore=True)
+        self.assertEqual(version.integer, 0)
+        self.assertEqual(len(list(self.model.history.versions())), 6)
+
+class SnapshotHistoryTest(TestCase):
+    def setUp(self):
+        self.model = models.SnapshotVersionedModel
+        self.history_model = self.model.history.model
+
+    def test_narrow_table(self):
+        columns = set(f.attname for f in self.history_model._meta.fields)
+        self.assertEqual(columns, set(['history_id', 'history_date',
+                                       'history_type', 'history_editor_id',
+                                       'id', 'history_snapshot']))
+
+    def test_lookups(self):
+        m = create_history(self.model, 'integer', range(3), characters='wide')
+        self.assertEqual(m.history.count(), 3)
+        self.assertEqual(m.history.most_recent().integer, 2)
+        self.assertEqual(m.history.most_recent().characters, 'wide')
+        self.assertEqual([v.integer for v in m.history.all()], [2, 1, 0])
+        self.assertEqual([c.name for c in m.history.all()[0].modified_fields],
+                         ['integer'])
+
+        # an unchanged save doesn't create a version
+        m.save()
+        self.assertEqual(m.history.count(), 3)
+
+    def test_field_change_counts(self):
+        create_history(self.model, 'integer', range(3))
+        with self.assertRaises(ImproperlyConfigured):
+            self.model.history.field_change_counts()
+
+    def test_find_drift(self):
+        objs = [create_history(self.model, 'integer', range(2))
+                for i in range(3)]
+        self.assertEqual(list(find_drift(self.history_model)), [[]])
+        self.model.objects.filter(pk=objs[1].pk).update(integer=5)
+        self.assertEqual(list(find_drift(self.history_model)),
+                         [[(objs[1].pk, MODIFIED)]])
+
+        # check_history covers snapshot models as well
+        out = StringIO()
+        call_command('check_history', repair=True, stdout=out)
+        self.assertIn("SnapshotVersionedModel: 1 objects out of sync",
+                      out.getvalue())
+        self.assertEqual(list(find_drift(self.history_model)), [[]])
+
+    def test_metadata_only(self):
+        create_history(self.model, 'integer', range(3))
+        records = list(self.model.history.metadata_only())
+        with self.assertNumQueries(1):
+            self.assertEqual([r.history_object.integer for r in records],
+                             [2, 1, 0])
+
+class FieldTimelineTest(TestCase):
+    def test_timeline(self):
+        m = create_history(models.VersionedModel, 'integer', [1, 2, 3])
+        m.characters = 'x'
+        m.save()
+        dates = list(m.history.order_by('history_id')
+                     .values_list('history_date', flat=True))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(m.history.field_timeline('integer')),
+                             [(dates[0], 1), (dates[1], 2), (dates[2], 3)])
+        self.assertEqual(
+            list(m.history.field_timeline('integer', dedupe=False)),
+            [(dates[0], 1), (dates[1], 2), (dates[2], 3), (dates[3], 3)])
+        self.assertEqual(
+            m.history.field_timeline('integer', start=dates[1], end=dates[3],
+                                     columns=True),
+            ([dates[1], dates[2]], [2, 3]))
+        self.assertEqual(
+            list(models.VersionedModel.history.field_timeline(
+                'characters', pk=m.pk)),
+            [(dates[0], ''), (dates[3], 'x')])
+
+    def test_snapshot_timeline(self):
+        m = create_history(models.SnapshotVersionedModel, 'integer', [1, 2])
+        m.characters = 'x'
+        m.save()
+        with self.assertNumQueries(1):
+            self.assertEqual([value for _, value in
+                              m.history.field_timeline('integer')], [1, 2])
+        self.assertEqual([value for _, value in m.history.field_timeline(
+            'integer', dedupe=False)], [1, 2, 2])
+
+    def test_untracked_field(self):
+        m = models.TaggedModel.objects.create(integer=1)
+        with self.assertRaises(ValueError):
+            m.history.field_timeline('tags')
+
+class AsRecordsTest(TestCase):
+    def test_records(self):
+        m = create_history(models.VersionedModel, 'integer', range(3))
+        with self.assertNumQueries(1):
+            records = list(m.history.as_records())
+        self.assertEqual([r.integer for r in records], [2, 1, 0])
+        self.assertEqual([r.history_type for r in records],
+                         [MODIFIED, MODIFIED, CREATED])
+        self.assertEqual(records[0].id, m.pk)
+        self.assertEqual(records[0].history_id, m.history.all()[0].history_id)
+
+        filtered = m.history.filter(integer__gte=1).as_records()
+        self.assertEqual([r.integer for r in filtered], [2, 1])
+
+    def test_chunks(self):
+        for i in range(5):
+            models.VersionedModel.objects.create(integer=i)
+        qs = models.VersionedModel.history.filter(integer__lt=4)
+        with self.assertNumQueries(3):
+            records = list(qs.as_records(chunk_size=2))
+        self.assertEqual([r.integer for r in records], [3, 2, 1, 0])
+
+    def test_snapshot_records(self):
+        m = create_history(models.SnapshotVersionedModel, 'integer', range(2),
+                           characters='wide')
+        records = list(m.history.as_records())
+        self.assertEqual([(r.integer, r.characters) for r in records],
+                         [(1, 'wide'), (0, 'wide')])
+
+class IgnoreChangesTest(TestCase):
+    def test_ignored_fields(self):
+        m = models.IgnoredChangesModel.objects.create(integer=1)
+        m.boolean = False
+        m.characters = 'seen'
+        m.save()
+        self.assertEqual(m.history.count(), 1)
+
+        # the ignored fields are still part of the next version
+        m.integer = 2
+        m.save()
+        self.assertEqual(m.history.count(), 2)
+        self.assertEqual(m.history.most_recent().characters, 'seen')
+        self.assertEqual(m.history.most_recent().boolean, False)
+
+    def test_update_fields(self):
+        m = models.IgnoredChangesModel.objects.create(integer=1)
+        m.characters = 'seen'
+        with self.assertNumQueries(1):
+            m.save(update_fields=['characters'])
+        self.assertEqual(m.history.count(), 1)
+
+        m.integer = 2
+        m.save(update_fields=['characters', 'integer'])
+        self.assertEqual(m.history.count(), 2)
+
+    def test_no_drift(self):
+        m = models.IgnoredChangesModel.objects.create(integer=1)
+        m.characters = 'ignored'
+        m.save()
+        history_model = models.IgnoredChangesModel.history.model
+        self.assertEqual(list(find_drift(history_model)), [[]])
+
 class EditorRequiredTest(TestCase):
     def testRequireEditor(self):
         u = User.objects.create_user('test', 'test@example.com', '?')
@@ -341,6 +736,47 @@ class PreservedForeignKeyTest(FkTestCase):
             self.assertEqual(p.rel_p_historical.count(), 10)
             self.assertEqual(p.rel_p_historical.exclude(fk=p).count(), 0)
 
+    def test_save_does_not_load_related(self):
+        obj = models.PreserveFkToNonversionedModel.objects.get(fk=self.nv)
+        obj.characters = 'saved again'
+        obj.save()
+        self.assertFalse(models.PreserveFkToNonversionedModel.fk.cache_name
+                         in obj.__dict__)
+        self.assertEqual(obj.history.most_recent().characters, 'saved again')
+
+    def test_delete_records_preserved_key(self):
+        obj = models.PreserveFkToNonversionedModel.objects.get(fk=self.nv)
+        obj_pk = obj.pk
+        obj.delete()
+        latest = models.PreserveFkToNonversionedModel.history\
+            .filter(id=obj_pk)[0]
+        self.assertEqual(latest.history_type, DELETED)
+        self.assertEqual(latest.fk, self.nv)
+
+    def test_deletes_in_one_batch(self):
+        model = models.PreserveFkToNonversionedModel
+        c1 = model.objects.get(fk=self.nv)
+        c2 = model.objects.create(fk=self.nv, characters='c2')
+        nv_pk = self.nv.pk
+        with HistoryBatch():
+            c1.delete()
+            self.nv.delete()
+        # as without the batch, deleting the parent removed the records
+        # referencing it, and c2 got no DELETED record
+        self.assertEqual(model.history.filter(fk__pk=nv_pk).count(), 0)
+        self.assertEqual(model.history.filter(id=c2.pk).count(), 0)
+
+    def test_delete_children_checks_parent_once(self):
+        for i in range(5):
+            models.PreserveFkToNonversionedModel.objects.create(fk=self.nv)
+        with QueryLog() as log:
+            models.PreserveFkToNonversionedModel.objects\
+                .filter(fk=self.nv).delete()
+        self.assertEqual(log.count('SELECT', 'FROM "test_app_nonversionedmodel"'),
+                         1)
+        self.assertEqual(models.PreserveFkToNonversionedModel.history
+                         .filter(history_type=DELETED).count(), 6)
+
     def test_drop_parent_cascade(self):
         self.nv.delete()
         self.assertEqual(models.PreserveFkToNonversionedModel.objects.count(), 0)
@@ -374,6 +810,39 @@ class ConvertedForeignKeyTest(FkTestCase):
         self.assertEqual(models.ConvertFkToVersionedModel.objects.count(), 0)
         self.assertNotEqual(models.ConvertFkToVersionedModel.history.count(), 0)
 
+class CascadeDeleteTest(FkTestCase):
+    def test_bulk_history_on_cascade(self):
+        children = [models.ConvertFkToNonversionedModel.objects.create(
+                        fk=self.nv, integer=i) for i in range(10)]
+        history_table = models.ConvertFkToNonversionedModel.history.model\
+            ._meta.db_table
+
+        with QueryLog() as log:
+            self.nv.delete()
+        self.assertEqual(log.count('INSERT', history_table), 1)
+
+        for child in children:
+            latest = models.ConvertFkToNonversionedModel.history\
+                .filter(id=child.pk)[0]
+            self.assertEqual(latest.history_type, DELETED)
+            self.assertEqual(latest.integer, child.integer)
+
+    def test_queryset_delete(self):
+        create_history(models.VersionedModel, 'integer', range(3))
+        models.VersionedModel.objects.all().delete()
+        self.assertEqual(models.VersionedModel.history
+                         .filter(history_type=DELETED).count(), 2)
+
+    def test_preserved_parent_checked_once(self):
+        for i in range(5):
+            models.PreserveFkToNonversionedModel.objects.create(fk=self.nv)
+        parent_table = models.NonversionedModel._meta.db_table
+        with QueryLog() as log:
+            self.nv.delete()
+        lookups = [sql for sql in log.queries if sql.startswith('SELECT') and
+                   ('FROM "%s"' % parent_table) in sql]
+        self.assertEqual(len(lookups), 1)
+
 class PropertyPatchTest(TestCase):
     def test_properties(self):
         # create model with multiple versions and assert that 'created_date'
@@ -436,3 +905,663 @@ class DateFieldAutoNowTest(TestCase):
             equal_versions = m.history.filter(**{field_name: 
                                                  earliest_historical})
             self.assertEqual(equal_versions.count(), 5)
+
+class RestoreToTest(TestCase):
+    def setUp(self):
+        self.kept = models.VersionedModel.objects.create(characters='kept')
+        self.changed = models.VersionedModel.objects.create(characters='a')
+        self.removed = models.VersionedModel.objects.create(characters='b')
+        self.restore_date = datetime.datetime.now()
+
+        self.changed.characters = 'changed'
+        self.changed.save()
+        # created before the delete, so that it can't reuse the deleted pk
+        self.added = models.VersionedModel.objects.create(characters='new')
+        self.removed_pk = self.removed.pk
+        self.removed.delete()
+
+    def test_restore_to(self):
+        u = User.objects.create_user('restorer', 'restorer@example.com', '!')
+        pks = [self.kept.pk, self.changed.pk, self.removed_pk, self.added.pk]
+        report = models.VersionedModel.history.restore_to(self.restore_date,
+                                                          pks, editor=u)
+
+        self.assertEqual(report['modified'], [self.changed.pk])
+        self.assertEqual(report['created'], [self.removed_pk])
+        self.assertEqual(report['deleted'], [self.added.pk])
+
+        current = models.VersionedModel.objects.in_bulk(pks)
+        self.assertEqual(sorted(current.keys()),
+                         sorted([self.kept.pk, self.changed.pk, self.removed_pk]))
+        self.assertEqual(current[self.changed.pk].characters, 'a')
+        self.assertEqual(current[self.removed_pk].characters, 'b')
+
+        self.assertEqual(self.kept.history.count(), 1)
+        for pk, history_type in [(self.changed.pk, MODIFIED),
+                                 (self.removed_pk, CREATED),
+                                 (self.added.pk, DELETED)]:
+            latest = models.VersionedModel.history.filter(id=pk)[0]
+            self.assertEqual(latest.history_type, history_type)
+            self.assertEqual(latest.history_editor, u)
+
+    def test_restore_to_with_queryset(self):
+        qs = models.VersionedModel.objects.all()
+        report = models.VersionedModel.history.restore_to(self.restore_date, qs)
+        self.assertEqual(report['deleted'], [self.added.pk])
+        self.assertEqual(report['modified'], [self.changed.pk])
+        self.assertEqual(report['created'], [])
+
+    def test_duplicate_pks(self):
+        pks = [self.changed.pk, self.changed.pk]
+        report = models.VersionedModel.history.restore_to(self.restore_date,
+                                                          pks)
+        self.assertEqual(report['modified'], [self.changed.pk])
+        self.assertEqual(self.changed.history.count(), 3)
+
+    def test_foreign_keys(self):
+        other = models.VersionedModel.objects.create(characters='other')
+        obj = models.ConvertFkToVersionedModel.objects.create(fk=self.kept)
+        date = datetime.datetime.now()
+        obj.fk = other
+        obj.save()
+
+        report = models.ConvertFkToVersionedModel.history.restore_to(
+            date, [obj.pk])
+        self.assertEqual(report['modified'], [obj.pk])
+        obj = models.ConvertFkToVersionedModel.objects.get(pk=obj.pk)
+        self.assertEqual(obj.fk_id, self.kept.pk)
+
+class PageTest(TestCase):
+    def setUp(self):
+        self.obj = create_history(models.VersionedModel, 'integer', range(25))
+        self.other = create_history(models.VersionedModel, 'integer', range(5))
+
+    def test_page_through_history(self):
+        expected = list(models.VersionedModel.history.order_by('-history_id')
+                        .values_list('history_id', flat=True))
+        seen, cursor = [], None
+        while True:
+            records, cursor = models.VersionedModel.history.page(after=cursor,
+                                                                 limit=7)
+            seen.extend(r.history_id for r in records)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_page_filters(self):
+        records, cursor = models.VersionedModel.history.page(pk=self.other.pk,
+                                                             limit=10)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(cursor, None)
+
+        records, cursor = self.obj.history.page(limit=10)
+        self.assertEqual([r.integer for r in records], list(range(24, 14, -1)))
+        records, cursor = self.obj.history.page(after=records[-1].history_id,
+                                                limit=10)
+        self.assertEqual([r.integer for r in records], list(range(14, 4, -1)))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            models.VersionedModel.history.page(after='bogus')
+
+class ModifiedFieldsTest(TestCase):
+    def test_modified_fields(self):
+        m = create_history(models.VersionedModel, 'characters', ['a', 'b'])
+        first, second = m.history.order_by('history_id')
+
+        changes = second.modified_fields
+        self.assertEqual([c.name for c in changes], ['characters'])
+        self.assertEqual((changes[0].from_value, changes[0].to_value),
+                         ('a', 'b'))
+        self.assertEqual(changes[0].verbose_name, 'characters')
+
+        # the first version reports every field as modified
+        self.assertEqual([c.name for c in first.modified_fields],
+                         first.important_field_names)
+
+    def test_comparators(self):
+        self.assertFalse(diff.decimals_differ(decimal.Decimal('1.10'), '1.1'))
+        self.assertTrue(diff.decimals_differ(decimal.Decimal('1.10'), None))
+        self.assertFalse(diff.texts_differ('{"a": 1, "b": 2}', '{"b":2,"a":1}'))
+        self.assertTrue(diff.texts_differ('{"a": 1}', '{"a": 2}'))
+        self.assertTrue(diff.texts_differ('{not json', '{not json '))
+
+    def test_json_equivalence(self):
+        field = DjangoTextField()
+        field.set_attributes_from_name('data')
+        Version = type('Version', (object,), {})
+        old, new = Version(), Version()
+        old.data, new.data = '[1, 2]', '[1,2]'
+
+        # reformatted JSON is still a change of the row...
+        self.assertTrue(diff.HistoryDiffer([field]).differs(old, new))
+        # ...but isn't reported as one
+        self.assertEqual(
+            diff.HistoryDiffer([field], json_aware=True).changes(old, new), [])
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.feed_models = [models.VersionedModel, models.AlternatePkNameModel]
+        for idx in range(5):
+            for model in self.feed_models:
+                model.objects.create(integer=idx)
+
+    def drain(self, feed):
+        records = []
+        while True:
+            batch = feed.poll()
+            if not batch:
+                return records
+            records.extend(batch)
+
+    def test_poll_in_order(self):
+        feed = ChangeFeed(models=self.feed_models, batch_size=3)
+        records = self.drain(feed)
+        self.assertEqual(len(records), 10)
+        dates = [r.history_date for r in records]
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(set(r.primary_model for r in records),
+                         set(self.feed_models))
+
+    def test_resume_from_cursor(self):
+        feed = ChangeFeed(models=self.feed_models)
+        self.assertEqual(len(feed.poll()), 10)
+        cursor = feed.cursor
+
+        m = models.VersionedModel.objects.create(integer=42)
+        resumed = ChangeFeed(cursor=cursor, models=self.feed_models)
+        records = resumed.poll()
+        self.assertEqual([r.integer for r in records], [42])
+        self.assertEqual(resumed.poll(), [])
+
+    def test_out_of_order_dates(self):
+        # the first record of a table committed last, as with a concurrent
+        # transaction
+        history = models.VersionedModel.history
+        first = history.order_by('history_id')[0]
+        history.filter(history_id=first.history_id).update(
+            history_date=datetime.datetime.now() + datetime.timedelta(hours=1))
+
+        feed = ChangeFeed(models=self.feed_models, batch_size=3)
+        records = self.drain(feed)
+        self.assertEqual(len(records), 10)
+        ids = [r.history_id for r in records
+               if r.primary_model is models.VersionedModel]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(feed.poll(), [])
+
+    def test_lag(self):
+        feed = ChangeFeed(models=self.feed_models,
+                          lag=datetime.timedelta(minutes=5))
+        self.assertEqual(feed.poll(), [])
+
+        # records written long enough ago are emitted, up to the first
+        # recent one of their table
+        history = models.VersionedModel.history
+        ids = list(history.order_by('history_id')
+                   .values_list('history_id', flat=True))
+        history.filter(history_id__in=ids[:2] + ids[3:]).update(
+            history_date=datetime.datetime.now() - datetime.timedelta(hours=1))
+        records = feed.poll()
+        self.assertEqual([r.history_id for r in records], ids[:2])
+
+class RetentionTest(TestCase):
+    def test_policies(self):
+        now = datetime.datetime(2012, 1, 10, 12, 0)
+        hour = datetime.timedelta(hours=1)
+        # newest first, as the pruning driver passes them
+        versions = [(5, now, MODIFIED),
+                    (4, now - hour * 2, MODIFIED),
+                    (3, now - hour * 25, MODIFIED),
+                    (2, now - hour * 26, MODIFIED),
+                    (1, now - hour * 72, CREATED)]
+        self.assertEqual(retention.KeepLast(2).prunable(versions, now),
+                         [3, 2, 1])
+        self.assertEqual(retention.MaxAge(hour * 48).prunable(versions, now),
+                         [1])
+        downsample = retention.Downsample('day', after=hour * 24)
+        self.assertEqual(downsample.prunable(versions, now), [2])
+        with self.assertRaises(ValueError):
+            retention.Downsample('fortnight')
+
+    def test_aware_dates(self):
+        date = lambda *args: datetime.datetime(*args, tzinfo=timezone.utc)
+        now = date(2012, 1, 12)
+        # 01:00, 23:00 and 22:00 in America/Chicago, the default time zone
+        versions = [(3, date(2012, 1, 10, 7), MODIFIED),
+                    (2, date(2012, 1, 10, 5), MODIFIED),
+                    (1, date(2012, 1, 10, 4), CREATED)]
+        downsample = retention.Downsample('day')
+        self.assertEqual(downsample.prunable(versions, now), [1])
+        max_age = retention.MaxAge(datetime.timedelta(hours=42))
+        self.assertEqual(max_age.prunable(versions, now), [2, 1])
+
+    def test_prune_history_command(self):
+        kept = create_history(models.RetainedVersionedModel, 'integer', range(10))
+        deleted = create_history(models.RetainedVersionedModel, 'integer', range(10))
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        call_command('prune_history', 'test_app.RetainedVersionedModel',
+                     chunk_size=1, batch_size=2, verbosity=0)
+
+        self.assertEqual(kept.history.count(), 3)
+        self.assertEqual(kept.history.most_recent().integer, 9)
+
+        history = models.RetainedVersionedModel.history.filter(id=deleted_pk)
+        self.assertEqual(history.count(), 3)
+        self.assertEqual(history[0].history_type, DELETED)
+        restored = models.RetainedVersionedModel.history\
+            .get_or_restore(pk=deleted_pk)
+        self.assertEqual(restored.integer, 9)
+
+class BackfillTest(TestCase):
+    def setUp(self):
+        self.objs = [models.VersionedModel.objects.create(integer=i)
+                     for i in range(5)]
+        # pretend history was only just added to the model
+        models.VersionedModel.history.all().delete()
+
+    def test_backfill(self):
+        call_command('backfill_history', 'test_app.VersionedModel',
+                     chunk_size=2, verbosity=0)
+        for obj in self.objs:
+            self.assertEqual(obj.history.count(), 1)
+            self.assertEqual(obj.history.most_recent().integer, obj.integer)
+            self.assertEqual(obj.history.all()[0].history_type, CREATED)
+
+        # objects that already have history are left alone
+        call_command('backfill_history', 'test_app.VersionedModel',
+                     chunk_size=2, verbosity=0)
+        self.assertEqual(models.VersionedModel.history.count(), 5)
+
+    def test_checkpoint(self):
+        fd, checkpoint = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with open(checkpoint, 'w') as f:
+                json.dump({'test_app.VersionedModel': self.objs[2].pk}, f)
+            call_command('backfill_history', 'test_app.VersionedModel',
+                         chunk_size=2, checkpoint=checkpoint, verbosity=0)
+
+            self.assertEqual([obj.history.count() for obj in self.objs],
+                             [0, 0, 0, 1, 1])
+            with open(checkpoint) as f:
+                self.assertEqual(json.load(f),
+                                 {'test_app.VersionedModel': self.objs[4].pk})
+        finally:
+            os.remove(checkpoint)
+
+class ConsistencyTest(TestCase):
+    def setUp(self):
+        self.objs = [models.VersionedModel.objects.create(integer=i)
+                     for i in range(6)]
+        self.history_model = models.VersionedModel.history.model
+
+    def drift(self):
+        return [d for chunk in find_drift(self.history_model, chunk_size=2)
+                for d in chunk]
+
+    def test_in_sync(self):
+        self.assertEqual(self.drift(), [])
+
+    def test_drift_and_repair(self):
+        updated, unrecorded, deleted = self.objs[1], self.objs[3], self.objs[4]
+        models.VersionedModel.objects.filter(pk=updated.pk).update(integer=99)
+        unrecorded.history.all().delete()
+        deleted_pk = deleted.pk
+        deleted.delete()
+        models.VersionedModel.history.filter(id=deleted_pk,
+                                             history_type=DELETED).delete()
+
+        self.assertEqual(self.drift(), [(updated.pk, MODIFIED),
+                                        (unrecorded.pk, CREATED),
+                                        (deleted_pk, DELETED)])
+
+        call_command('check_history', 'test_app.VersionedModel',
+                     repair=True, chunk_size=2, verbosity=0)
+        self.assertEqual(self.drift(), [])
+        self.assertEqual(updated.history.most_recent().integer, 99)
+        with self.assertRaises(models.VersionedModel.DoesNotExist):
+            models.VersionedModel.history.as_of(datetime.datetime.now(),
+                                                pk=deleted_pk)
+
+class FieldChangeCountsTest(TestCase):
+    def test_field_change_counts(self):
+        users = [User.objects.create_user(u, '%s@example.com' % u, u)
+                 for u in ['hana', 'ivan']]
+        m = models.VersionedModel.objects.create(characters='a', editor=users[0])
+        for characters, integer, editor in [('b', -1, users[0]),
+                                            ('c', 5, users[1]),
+                                            ('c', 6, users[1])]:
+            m.characters = characters
+            m.integer = integer
+            m.save(editor=editor)
+        other = create_history(models.VersionedModel, 'integer', range(3))
+
+        self.assertEqual(m.history.field_change_counts(),
+                         {'characters': 2, 'integer': 2, 'boolean': 0})
+        self.assertEqual(models.VersionedModel.history.field_change_counts(),
+                         {'characters': 2, 'integer': 4, 'boolean': 0})
+        self.assertEqual(m.history.field_change_counts(group_by='editor'), {
+            users[0].pk: {'characters': 1, 'integer': 0, 'boolean': 0},
+            users[1].pk: {'characters': 1, 'integer': 2, 'boolean': 0},
+        })
+        self.assertEqual(m.history.field_change_counts(group_by='day'), {
+            datetime.date.today(): {'characters': 2, 'integer': 2, 'boolean': 0},
+        })
+        tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+        self.assertEqual(m.history.field_change_counts(start=tomorrow),
+                         {'characters': 0, 'integer': 0, 'boolean': 0})
+
+class ManyToManyHistoryTest(TestCase):
+    def setUp(self):
+        self.tags = [models.Tag.objects.create(name=n) for n in 'abcd']
+        self.obj = models.TaggedModel.objects.create()
+
+    def snapshot(self):
+        return datetime.datetime.now(), set(t.pk for t in self.obj.tags.all())
+
+    def test_m2m_as_of(self):
+        a, b, c, d = self.tags
+        snapshots = [self.snapshot()]
+        self.obj.tags.add(a, b, c)
+        snapshots.append(self.snapshot())
+        self.obj.tags.remove(b)
+        snapshots.append(self.snapshot())
+        d.tagged.add(self.obj)
+        snapshots.append(self.snapshot())
+        self.obj.tags.clear()
+        snapshots.append(self.snapshot())
+        self.obj.tags.add(b)
+        snapshots.append(self.snapshot())
+
+        for date, expected in snapshots:
+            self.assertEqual(self.obj.history.m2m_as_of('tags', date), expected)
+            self.assertEqual(models.TaggedModel.history
+                             .m2m_as_of('tags', date, pk=self.obj.pk), expected)
+
+    def test_bulk_add_is_one_insert(self):
+        history_table = models.TaggedModel.history.model\
+            .m2m_history_models['tags']._meta.db_table
+        with QueryLog() as log:
+            self.obj.tags.add(*self.tags)
+        self.assertEqual(log.count('INSERT', history_table), 1)
+
+    def test_related_ids(self):
+        self.obj.tags.add(*self.tags[:2])
+        self.obj.characters = 'tagged'
+        self.obj.save()
+        version = self.obj.history.all()[0]
+        self.assertEqual(version.related_ids('tags'),
+                         set(t.pk for t in self.tags[:2]))
+        with self.assertRaises(ValueError):
+            self.obj.history.m2m_as_of('characters', datetime.datetime.now())
+
+class MetadataOnlyTest(TestCase):
+    def setUp(self):
+        self.obj = create_history(models.VersionedModel, 'characters',
+                                  ['v%s' % i for i in range(5)])
+
+    def test_metadata_only(self):
+        with self.assertNumQueries(1):
+            records = list(self.obj.history.metadata_only())
+            self.assertEqual([r.history_type for r in records],
+                             [MODIFIED] * 4 + [CREATED])
+            self.assertEqual(records[0].id, self.obj.pk)
+
+        # all records get their remaining fields from one query
+        with self.assertNumQueries(1):
+            values = [r.history_object.characters for r in records]
+        self.assertEqual(values, ['v%s' % i for i in reversed(range(5))])
+
+        changes = records[0].modified_fields
+        self.assertEqual([(c.name, c.from_value, c.to_value) for c in changes],
+                         [('characters', 'v3', 'v4')])
+
+    def test_deferred_field_values(self):
+        records = list(self.obj.history.metadata_only())
+        self.assertTrue(records[2]._deferred)
+        self.assertNotEqual(records[2].__class__, self.obj.history.model)
+        self.assertNotIn('characters', records[2].__dict__)
+        with self.assertNumQueries(1):
+            self.assertEqual(records[2].characters, 'v2')
+        self.assertEqual([r.characters for r in records],
+                         ['v%s' % i for i in reversed(range(5))])
+
+class GraphAsOfTest(TestCase):
+    def setUp(self):
+        self.nv = models.NonversionedModel.objects.create(characters='nv')
+        self.v = models.VersionedModel.objects.create(characters='v-old')
+        self.middle = models.ConvertFkToVersionedModel.objects.create(
+            fk=self.v, characters='middle-old')
+        self.leaf = models.ChainedFkModel.objects.create(fk=self.middle,
+                                                         characters='leaf')
+        self.other = models.DeferredClassBuildModel.objects.create(
+            fk1=self.nv, fk2=self.v)
+        self.date = datetime.datetime.now()
+
+        self.v.characters = 'v-new'
+        self.v.save()
+        self.middle.characters = 'middle-new'
+        self.middle.save()
+
+    def test_graph_as_of(self):
+        with self.assertNumQueries(5):
+            leaf = self.leaf.history.graph_as_of(self.date,
+                                                 follow=['fk', 'fk__fk'])
+        with self.assertNumQueries(0):
+            self.assertEqual(leaf.fk.characters, 'middle-old')
+            self.assertEqual(leaf.fk.fk.characters, 'v-old')
+
+        current = self.leaf.history.graph_as_of(datetime.datetime.now(),
+                                                follow=['fk__fk'])
+        self.assertEqual(current.fk.characters, 'middle-new')
+        self.assertEqual(current.fk.fk.characters, 'v-new')
+
+    def test_untracked_relations(self):
+        other = models.DeferredClassBuildModel.history.graph_as_of(
+            self.date, follow=['fk1', 'fk2'], pk=self.other.pk)
+        self.assertEqual(other.fk1, self.nv)
+        self.assertEqual(other.fk1.characters, 'nv')
+        self.assertEqual(other.fk2.characters, 'v-old')
+
+    def test_invalid_path(self):
+        with self.assertRaises(ValueError):
+            self.leaf.history.graph_as_of(self.date, follow=['characters'])
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(u, '%s@example.com' % u, u)
+                      for u in ['jane', 'karl']]
+        self.timeline_models = [models.VersionedModel,
+                                models.AlternatePkNameModel]
+        for idx in range(6):
+            for model in self.timeline_models:
+                model.objects.create(integer=idx,
+                                     editor=self.users[idx % 2])
+
+    def test_timeline(self):
+        records = list(timeline(self.timeline_models, page_size=2))
+        self.assertEqual(len(records), 12)
+        dates = [r.history_date for r in records]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_filtered_timeline(self):
+        records = list(timeline(self.timeline_models, page_size=2,
+                                editor=self.users[0]))
+        self.assertEqual(len(records), 6)
+        self.assertEqual(set(r.history_editor for r in records),
+                         set([self.users[0]]))
+        self.assertEqual([r.integer for r in records][::2], [4, 2, 0])
+
+        records = list(timeline(self.timeline_models, integer__gte=4))
+        self.assertEqual(len(records), 4)
+
+    def test_out_of_order_dates(self):
+        history = models.VersionedModel.history
+        last = history.order_by('-history_id')[0]
+        history.filter(history_id=last.history_id).update(
+            history_date=datetime.datetime.now() - datetime.timedelta(days=1))
+
+        records = list(timeline(self.timeline_models, page_size=2))
+        self.assertEqual(len(records), 12)
+        dates = [r.history_date for r in records]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual(records[-1].history_id, last.history_id)
+
+class ByEditorTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(u, '%s@example.com' % u, u)
+                      for u in ['lena', 'mark']]
+        self.start = datetime.datetime.now()
+        for idx in range(7):
+            models.VersionedModel.objects.create(integer=idx,
+                                                 editor=self.users[idx % 2])
+            models.AlternatePkNameModel.objects.create(integer=idx,
+                                                       editor=self.users[0])
+
+    def test_editor_index(self):
+        self.assertTrue(('history_editor', 'history_date') in
+                        models.VersionedModel.history.model._meta.index_together)
+
+    def test_by_editor(self):
+        records = list(models.VersionedModel.history.by_editor(
+            self.users[0], page_size=2))
+        self.assertEqual([r.integer for r in records], [6, 4, 2, 0])
+
+        records = list(models.VersionedModel.history.by_editor(
+            self.users[0], start=self.start, end=self.start))
+        self.assertEqual(records, [])
+
+    def test_by_editor_across_models(self):
+        records = list(feed.by_editor(self.users[0], start=self.start,
+                                      models=[models.VersionedModel,
+                                              models.AlternatePkNameModel],
+                                      page_size=3))
+        self.assertEqual(len(records), 11)
+        keys = [(r.history_date, r.history_id) for r in records]
+        self.assertEqual([k[0] for k in keys],
+                         sorted([k[0] for k in keys], reverse=True))
+
+class CollapseVersionsTest(TestCase):
+    def test_create_and_update(self):
+        with HistoryBatch(collapse=True):
+            m = models.VersionedModel.objects.create(characters='a')
+            m.characters = 'b'
+            m.save()
+            m.integer = 5
+            m.save()
+            # the version is written, and kept up to date, right away
+            self.assertEqual(m.history.count(), 1)
+            self.assertEqual(m.history.most_recent().integer, 5)
+
+        self.assertEqual(m.history.count(), 1)
+        version = m.history.all()[0]
+        self.assertEqual(version.history_type, CREATED)
+        self.assertEqual((version.characters, version.integer), ('b', 5))
+
+    def test_update_and_revert(self):
+        m = models.VersionedModel.objects.create(characters='a')
+        with HistoryBatch(collapse=True):
+            m.characters = 'b'
+            m.save()
+            m.characters = 'c'
+            m.save()
+        self.assertEqual([v.history_type for v in m.history.all()],
+                         [MODIFIED, CREATED])
+        self.assertEqual(m.history.most_recent().characters, 'c')
+
+        with HistoryBatch(collapse=True):
+            m.characters = 'd'
+            m.save()
+            m.characters = 'c'
+            m.save()
+        self.assertEqual(m.history.count(), 2)
+
+    def test_delete(self):
+        with HistoryBatch(collapse=True):
+            m = models.VersionedModel.objects.create(characters='a')
+            m.characters = 'b'
+            m.save()
+            m_pk = m.pk
+            m.delete()
+            # deletions aren't held back by the collapsing batch
+            types = models.VersionedModel.history.filter(id=m_pk)\
+                .values_list('history_type', flat=True)
+            self.assertEqual(list(types), [DELETED, CREATED])
+        types = models.VersionedModel.history.filter(id=m_pk)\
+            .values_list('history_type', flat=True)
+        self.assertEqual(list(types), [DELETED, CREATED])
+
+    def test_rollback(self):
+        m = models.VersionedModel.objects.create(characters='a')
+        try:
+            with transaction.commit_on_success():
+                with HistoryBatch(collapse=True):
+                    m.characters = 'b'
+                    m.save()
+                    m.characters = 'c'
+                    m.save()
+                    raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(m.history.count(), 1)
+        self.assertEqual(m.history.most_recent().characters, 'a')
+
+    def test_save_after_rollback(self):
+        m = models.VersionedModel.objects.create(characters='a')
+        with HistoryBatch(collapse=True):
+            try:
+                with transaction.commit_on_success():
+                    m.characters = 'b'
+                    m.save()
+                    raise ValueError
+            except ValueError:
+                pass
+            m.characters = 'c'
+            m.save()
+            m.characters = 'a'
+            m.save()
+            m.characters = 'd'
+            m.save()
+        self.assertEqual([r.characters for r in m.history.all()], ['d', 'a'])
+        self.assertEqual(m.history.most_recent().history_type, MODIFIED)
+
+    def test_middleware(self):
+        middleware = CollapseHistoryMiddleware()
+        request = type('Request', (object,), {})()
+        middleware.process_request(request)
+        m = models.VersionedModel.objects.create(characters='a')
+        m.characters = 'b'
+        m.save()
+        middleware.process_response(request, None)
+        self.assertEqual(m.history.count(), 1)
+        self.assertEqual(HistoryBatch.current(), None)
+
+def in_memory_database():
+    return connection.vendor == 'sqlite' and \
+        connection.settings_dict['NAME'] in ('', ':memory:')
+
+@unittest.skipIf(pool.ThreadPoolExecutor is None, "futures isn't installed")
+class ConcurrentLookupTest(TestCase):
+    def test_submit(self):
+        futures = [pool.submit(pow, i, 2) for i in range(5)]
+        self.assertEqual([f.result() for f in futures], [0, 1, 4, 9, 16])
+
+    def test_lookups(self):
+        # checked here: the test database only replaces NAME once the test
+        # run has started
+        if in_memory_database():
+            self.skipTest("worker threads can't see an in-memory database")
+        objs = [create_history(models.VersionedModel, 'integer', range(i + 1))
+                for i in range(3)]
+        futures = [obj.history.amost_recent() for obj in objs]
+        self.assertEqual([f.result().integer for f in futures], [0, 1, 2])
+
+        as_of = objs[2].history.aas_of(datetime.datetime.now())
+        self.assertEqual(as_of.result().integer, 2)
+        records, cursor = objs[2].history.apage(limit=2).result()
+        self.assertEqual([r.integer for r in records], [2, 1])
+        self.assertEqual(objs[0].history.acreated_date().result(),
+                         objs[0].history.created_date)